@@ -0,0 +1,183 @@
+"""Local stand-in for the Alpha Vantage REST API.
+
+Serves synthetic (or recorded) TIME_SERIES_DAILY_ADJUSTED, OVERVIEW,
+NEWS_SENTIMENT and TIME_SERIES_INTRADAY payloads so the app can be
+benchmarked without network access or API quota. Point the app at it
+with ALPHAVANTAGE_BASE_URL, e.g.:
+
+    python benchmarks/fake_alpha_vantage.py --port 5001 --latency 0.05
+    FLASK_ALPHAVANTAGE_BASE_URL=http://127.0.0.1:5001/query \\
+    FLASK_ALPHAVANTAGE_CALLS_PER_MINUTE=100000 flask --app flaskr run
+
+A recorded payload saved as <record-dir>/<FUNCTION>_<SYMBOL>.json is
+served in place of the synthetic one.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import time
+import zlib
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from flask import Flask, jsonify, request
+
+COMPACT_BARS = 100
+FULL_YEARS = 20
+
+app = Flask(__name__)
+app.config.update(LATENCY=0.0, RECORD_DIR=None)
+# Keep the API's newest-first key order
+app.json.sort_keys = False
+
+
+def symbol_rng(symbol, salt=''):
+    # Stable across runs and processes, unlike hash()
+    return random.Random(zlib.crc32(f'{symbol}:{salt}'.encode()))
+
+
+def trading_days(end, count):
+    days = []
+    day = end
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(day)
+        day -= timedelta(days=1)
+    return days  # newest first, like the real API
+
+
+@lru_cache(maxsize=256)
+def daily_bars(symbol, end):
+    full_days = trading_days(end, FULL_YEARS * 252)
+    rng = symbol_rng(symbol, 'daily')
+    price = 20 + rng.random() * 300
+    bars = {}
+    # Walk forward in time so the series is the same whatever the outputsize
+    for day in reversed(full_days):
+        change = rng.gauss(0.0003, 0.018)
+        open_price = price
+        price = max(1.0, price * math.exp(change))
+        high = max(open_price, price) * (1 + abs(rng.gauss(0, 0.005)))
+        low = min(open_price, price) * (1 - abs(rng.gauss(0, 0.005)))
+        bars[day.strftime('%Y-%m-%d')] = {
+            '1. open': f'{open_price:.4f}',
+            '2. high': f'{high:.4f}',
+            '3. low': f'{low:.4f}',
+            '4. close': f'{price:.4f}',
+            '5. adjusted close': f'{price:.4f}',
+            '6. volume': str(rng.randint(100000, 50000000)),
+            '7. dividend amount': '0.0000',
+            '8. split coefficient': '1.0',
+        }
+    return bars
+
+
+def daily_series(symbol, outputsize):
+    bars = daily_bars(symbol, datetime.now().date())
+    dates = sorted(bars, reverse=True)
+    if outputsize != 'full':
+        dates = dates[:COMPACT_BARS]
+    return {
+        'Meta Data': {
+            '1. Information': 'Daily Time Series with Splits and Dividend Events',
+            '2. Symbol': symbol,
+            '3. Last Refreshed': dates[0],
+            '4. Output Size': 'Full size' if outputsize == 'full' else 'Compact',
+            '5. Time Zone': 'US/Eastern',
+        },
+        'Time Series (Daily)': {date: bars[date] for date in dates},
+    }
+
+
+def intraday_series(symbol):
+    rng = symbol_rng(symbol, 'intraday')
+    now = datetime.now().replace(second=0, microsecond=0)
+    price = 20 + rng.random() * 300
+    bars = {}
+    for minute in range(100):
+        price *= math.exp(rng.gauss(0, 0.001))
+        stamp = (now - timedelta(minutes=minute)).strftime('%Y-%m-%d %H:%M:%S')
+        bars[stamp] = {'1. open': f'{price:.4f}', '2. high': f'{price:.4f}', '3. low': f'{price:.4f}',
+                       '4. close': f'{price:.4f}', '5. volume': str(rng.randint(1000, 100000))}
+    return {'Meta Data': {'2. Symbol': symbol, '4. Interval': '1min'}, 'Time Series (1min)': bars}
+
+
+def overview(symbol):
+    rng = symbol_rng(symbol, 'overview')
+    return {
+        'Symbol': symbol,
+        'Name': f'{symbol} Synthetic Inc.',
+        'Exchange': 'NASDAQ',
+        'Sector': 'TECHNOLOGY',
+        'Industry': 'SYNTHETIC DATA',
+        'MarketCapitalization': str(rng.randint(10 ** 8, 10 ** 12)),
+        'PERatio': f'{rng.uniform(5, 60):.2f}',
+        'EPS': f'{rng.uniform(-2, 15):.2f}',
+        'DividendPerShare': f'{rng.uniform(0, 4):.2f}',
+        '52WeekHigh': f'{rng.uniform(100, 400):.2f}',
+        '52WeekLow': f'{rng.uniform(10, 100):.2f}',
+    }
+
+
+def news(symbol):
+    return {
+        'items': '5',
+        'feed': [{
+            'title': f'{symbol} synthetic headline {i + 1}',
+            'url': f'https://example.com/{symbol.lower()}/{i + 1}',
+            'summary': 'Generated by the local Alpha Vantage stand-in.',
+            'time_published': datetime.now().strftime('%Y%m%dT%H%M%S'),
+            'overall_sentiment_score': 0.0,
+        } for i in range(5)],
+    }
+
+
+def recorded(function, symbol):
+    record_dir = app.config['RECORD_DIR']
+    if not record_dir:
+        return None
+    path = os.path.join(record_dir, f'{function}_{symbol}.json')
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf8') as f:
+        return json.load(f)
+
+
+@app.route('/query')
+def query():
+    if app.config['LATENCY']:
+        time.sleep(app.config['LATENCY'])
+    function = request.args.get('function', '')
+    symbol = (request.args.get('symbol') or request.args.get('tickers') or '').upper()
+    if not symbol:
+        return jsonify({'Error Message': 'Invalid API call: missing symbol.'})
+
+    payload = recorded(function, symbol)
+    if payload is not None:
+        return jsonify(payload)
+    if function == 'TIME_SERIES_DAILY_ADJUSTED':
+        return jsonify(daily_series(symbol, request.args.get('outputsize', 'compact')))
+    if function == 'TIME_SERIES_INTRADAY':
+        return jsonify(intraday_series(symbol))
+    if function == 'OVERVIEW':
+        return jsonify(overview(symbol))
+    if function == 'NEWS_SENTIMENT':
+        return jsonify(news(symbol))
+    return jsonify({'Error Message': f'Function {function} is not supported by the stand-in.'})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local Alpha Vantage stand-in server.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to delay every response.')
+    parser.add_argument('--record-dir', help='Directory of recorded <FUNCTION>_<SYMBOL>.json payloads.')
+    args = parser.parse_args()
+    app.config.update(LATENCY=args.latency, RECORD_DIR=args.record_dir)
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
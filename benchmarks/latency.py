@@ -0,0 +1,170 @@
+"""End-to-end latency benchmark for the main BigBucks endpoints.
+
+Drives /plot/<symbol> together with its /api/plot/<symbol>/<chart>
+calls, /transaction/buy, /transaction/batch, /profile/get-plot-data and
+/stock/<symbol> with concurrent logged-in clients and reports p50, p95
+and p99 latency per endpoint plus overall throughput. Run it against an
+app pointed at benchmarks/fake_alpha_vantage.py so results do not
+depend on the live API:
+
+    python benchmarks/latency.py --base-url http://127.0.0.1:5000 --clients 8 --duration 30
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+import requests
+
+DEFAULT_SYMBOLS = ['AAPL', 'MSFT', 'GOOG', 'TSLA', 'AMZN']
+
+
+def login(base_url):
+    """Register a throwaway user and return a logged-in session."""
+    session = requests.Session()
+    username = f'bench-{uuid.uuid4().hex[:12]}'
+    credentials = {'username': username, 'password': 'benchmark'}
+    session.post(f'{base_url}/auth/register', data=credentials, allow_redirects=False)
+    response = session.post(f'{base_url}/auth/login', data=credentials, allow_redirects=False)
+    if response.status_code != 302:
+        raise RuntimeError(f'Could not log in as {username}: HTTP {response.status_code}')
+    return session
+
+
+def load_plot_page(base_url, session, symbol, max_points=1200):
+    """Open /plot/<symbol> and fetch every chart from the API the way the page does.
+
+    Returns the first failed response, or the last one when all succeeded.
+    """
+    response = session.get(f'{base_url}/plot/{symbol}')
+    if response.status_code >= 400:
+        return response
+    listing = session.get(f'{base_url}/api/plot/{symbol}')
+    if listing.status_code >= 400:
+        return listing
+    for chart in listing.json()['charts']:
+        response = session.get(f'{base_url}/api/plot/{symbol}/{chart}', params={'max_points': max_points})
+        if response.status_code >= 400:
+            return response
+    return response
+
+
+def build_scenarios(base_url, symbols):
+    return {
+        # The page itself is a skeleton; the chart work happens in the API calls
+        'plot': lambda session: load_plot_page(base_url, session, random.choice(symbols)),
+        'buy': lambda session: session.post(f'{base_url}/transaction/buy',
+                                            data={'symbol': random.choice(symbols), 'quantity': 1},
+                                            allow_redirects=False),
+        'batch': lambda session: session.post(
+            f'{base_url}/transaction/batch',
+            json={'orders': [{'symbol': symbol, 'action': 'buy', 'quantity': 1}
+                             for symbol in random.sample(symbols, min(3, len(symbols)))]},
+            allow_redirects=False),
+        'profile': lambda session: session.get(f'{base_url}/profile/get-plot-data'),
+        'stock': lambda session: session.get(f'{base_url}/stock/{random.choice(symbols)}'),
+    }
+
+
+def succeeded(name, session, response):
+    """Whether a scenario really did its work, not just answered without an error status.
+
+    The buy form redirects the same way whether or not the trade went
+    through, so its outcome is read from the flash on the page it
+    redirects to. That extra request is not part of the timed sample.
+    """
+    if name == 'buy':
+        if response.status_code != 302:
+            return False
+        page = session.get(requests.compat.urljoin(response.url, response.headers['Location']))
+        return 'alert-success' in page.text
+    if name == 'batch':
+        if response.status_code != 200:
+            return False
+        try:
+            return response.json().get('status') == 'success'
+        except ValueError:
+            return False
+    return response.status_code < 400
+
+
+def run_client(base_url, scenarios, weights, deadline, results, errors, lock):
+    session = login(base_url)
+    # The profile endpoint needs at least one holding; checking the
+    # result also consumes its flash
+    succeeded('buy', session, scenarios['buy'](session))
+    names = list(scenarios)
+    while time.monotonic() < deadline:
+        name = random.choices(names, weights=[weights[n] for n in names])[0]
+        started = time.perf_counter()
+        response = None
+        try:
+            response = scenarios[name](session)
+        except requests.RequestException:
+            pass
+        elapsed = time.perf_counter() - started
+        try:
+            ok = response is not None and succeeded(name, session, response)
+        except requests.RequestException:
+            ok = False
+        with lock:
+            results[name].append(elapsed)
+            if not ok:
+                errors[name] += 1
+
+
+def percentile(samples, q):
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[q - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to run.')
+    parser.add_argument('--symbols', nargs='+', default=DEFAULT_SYMBOLS)
+    parser.add_argument('--mix', default='plot=4,buy=1,batch=1,profile=2,stock=3',
+                        help='Relative weight of each endpoint.')
+    args = parser.parse_args()
+
+    base_url = args.base_url.rstrip('/')
+    scenarios = build_scenarios(base_url, args.symbols)
+    weights = {name: 0.0 for name in scenarios}
+    for item in args.mix.split(','):
+        name, weight = item.split('=')
+        weights[name] = float(weight)
+
+    results = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    started = time.monotonic()
+    deadline = started + args.duration
+    threads = [
+        threading.Thread(target=run_client,
+                         args=(base_url, scenarios, weights, deadline, results, errors, lock))
+        for _ in range(args.clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    total = sum(len(samples) for samples in results.values())
+    print(f'{args.clients} clients, {elapsed:.1f}s, {total} requests, {total / elapsed:.1f} req/s')
+    print(f'{"endpoint":<10}{"count":>8}{"errors":>8}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+    for name in scenarios:
+        samples = sorted(results[name])
+        if not samples:
+            continue
+        p50, p95, p99 = (percentile(samples, q) * 1000 for q in (50, 95, 99))
+        print(f'{name:<10}{len(samples):>8}{errors[name]:>8}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
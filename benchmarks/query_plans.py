@@ -0,0 +1,103 @@
+"""Show query plans and timings of the hot queries before and after migrations.
+
+Works on a temporary copy of the database, so the original is never
+modified. Usage:
+
+    python benchmarks/query_plans.py [--db instance/flaskr.sqlite] [--synthetic-transactions 200000]
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from flaskr.migrate import apply_migrations, get_schema_version
+
+HOT_QUERIES = {
+    'user transaction history page': (
+        '''SELECT * FROM transactions_history t
+        WHERE t.user_id = ? AND (t.timestamp, t.id) < (?, ?)
+        ORDER BY t.timestamp DESC, t.id DESC LIMIT 21''',
+        (1, '2024-04-23 12:00:00', 1 << 62)),
+    'holding lookup': (
+        'SELECT * FROM user_assets WHERE user_id = ? AND symbol = ?',
+        (1, 'AAPL')),
+    'admin transactions by day, first page': (
+        '''SELECT t.id, u.username, t.symbol, t.type, t.quantity, t.price, t.timestamp
+        FROM transactions_history t
+        JOIN user_info u ON t.user_id = u.id
+        WHERE t.timestamp >= ? AND t.timestamp < ?
+        ORDER BY t.timestamp DESC, t.id DESC LIMIT 21''',
+        ('2024-04-23', '2024-04-24')),
+    'latest price per symbol': (
+        '''SELECT sh.symbol, sh.adjusted_close
+        FROM stock_history sh
+        INNER JOIN (
+            SELECT symbol, MAX(date) as max_date
+            FROM stock_history
+            GROUP BY symbol
+        ) latest ON sh.symbol = latest.symbol AND sh.date = latest.max_date''',
+        ()),
+}
+
+
+def add_synthetic_transactions(conn, count, users=500):
+    # Spread rows over many user ids so per-user queries see a realistic share
+    user_ids = range(1, users + 1)
+    symbols = [row[0] for row in conn.execute('SELECT DISTINCT symbol FROM stock_history')] or ['AAPL']
+    start = datetime(2019, 1, 1)
+    rows = [
+        (random.choice(user_ids), random.choice(symbols), random.choice(('BUY', 'SELL')),
+         random.randint(1, 100), round(random.uniform(1, 500), 2),
+         (start + timedelta(seconds=random.randint(0, 5 * 365 * 86400))).strftime('%Y-%m-%d %H:%M:%S'))
+        for _ in range(count)
+    ]
+    conn.executemany(
+        'INSERT INTO transactions_history (user_id, symbol, type, quantity, price, timestamp) VALUES (?, ?, ?, ?, ?, ?)',
+        rows)
+    conn.commit()
+
+
+def report(conn, label, repeat):
+    print(f'== {label} (schema version {get_schema_version(conn)}) ==')
+    for name, (query, params) in HOT_QUERIES.items():
+        plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {query}', params)]
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            conn.execute(query, params).fetchall()
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        print(f'{name}: median {timings[len(timings) // 2] * 1000:.3f} ms')
+        for step in plan:
+            print(f'    {step}')
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default=os.path.join(os.path.dirname(__file__), '..', 'instance', 'flaskr.sqlite'))
+    parser.add_argument('--synthetic-transactions', type=int, default=0,
+                        help='Add this many random transactions to the copy first.')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'benchmark.sqlite')
+        shutil.copy(args.db, path)
+        conn = sqlite3.connect(path)
+        if args.synthetic_transactions:
+            add_synthetic_transactions(conn, args.synthetic_transactions)
+        report(conn, 'before', args.repeat)
+        apply_migrations(conn)
+        report(conn, 'after', args.repeat)
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -9,19 +9,50 @@ def create_app():
 
     app.config.from_mapping(
         DATABASE=os.path.join(app.instance_path, 'flaskr.sqlite'),
+        # Alpha Vantage response cache; set API_CACHE to None to disable it
+        API_CACHE=os.path.join(app.instance_path, 'api_cache.sqlite'),
+        API_CACHE_MAX_BYTES=64 * 1024 * 1024,
+        # Point at a local stand-in (see benchmarks/fake_alpha_vantage.py) for offline runs
+        ALPHAVANTAGE_BASE_URL='https://www.alphavantage.co/query',
+        # Process-wide Alpha Vantage quota; the free plan allows 5 calls per minute
+        ALPHAVANTAGE_CALLS_PER_MINUTE=5,
+        ALPHAVANTAGE_BURST=None,
+        ALPHAVANTAGE_MAX_WAIT=120,
+        # Seconds a page view or trade waits for quota before failing fast
+        ALPHAVANTAGE_INTERACTIVE_MAX_WAIT=5,
+        # Background ingestion; REFRESH_INTERVAL of None means "after each market close"
+        REFRESH_SCHEDULER=False,
+        REFRESH_INTERVAL=None,
+        REFRESH_RECENT_DAYS=7,
+        REFRESH_PAUSE_SECONDS=0,
+        # Rendered /plot/<symbol> charts kept in memory
+        CHART_CACHE_MAX_BYTES=32 * 1024 * 1024,
+        CHART_CACHE_TTL=60 * 60,
+        # Points per time-series chart when the page does not ask for a number
+        CHART_MAX_POINTS=2000,
+        # Directory of memory-mapped per-symbol price arrays kept in sync by
+        # ingestion, e.g. os.path.join(app.instance_path, 'columnar'); None disables it
+        COLUMNAR_STORE=None,
     )
+    # Allow overrides such as FLASK_REFRESH_SCHEDULER=true from the environment
+    app.config.from_prefixed_env()
 
     try:
         os.makedirs(app.instance_path)
     except OSError:
         pass
 
+    from .rate_limit import configure_upstream
+    configure_upstream(app.config['ALPHAVANTAGE_CALLS_PER_MINUTE'], app.config['ALPHAVANTAGE_BURST'],
+                       app.config['ALPHAVANTAGE_MAX_WAIT'], app.config['ALPHAVANTAGE_INTERACTIVE_MAX_WAIT'])
+
     # Import Blueprints
     from .main import bp as main_bp
     from .auth import bp as auth_bp
     from .admin import bp as admin_bp
     from .stock import bp as stock_bp
     from .profile import bp as profile_bp
+    from .api import bp as api_bp
 
     # Register Blueprints
     app.register_blueprint(main_bp)
@@ -29,6 +60,7 @@ def create_app():
     app.register_blueprint(admin_bp)
     app.register_blueprint(stock_bp)
     app.register_blueprint(profile_bp)
+    app.register_blueprint(api_bp)
 
     from .db import get_db, close_db
     app.teardown_appcontext(close_db)
@@ -39,6 +71,7 @@ def create_app():
         with app.open_resource('schema.sql') as f:
             db.executescript(f.read().decode('utf8'))
         db.commit()
+        apply_migrations(db)
 
     # Define a command that can be called from the command line
     @click.command('init-db')
@@ -48,8 +81,25 @@ def create_app():
         init_db()
         click.echo('Initialized the database.')
 
+    from .api_cache import api_cache_stats_command
+    from .migrate import migrate_command, apply_migrations, check_schema_version
+    from .scheduler import refresh_data_command, init_scheduler
+    from .columnar_store import columnar_store_command
+    from .aggregates import rebuild_aggregates_command
+    from .indicators import rebuild_indicators_command
+
     # Register commands into Flask application
     app.cli.add_command(init_db_command)
+    app.cli.add_command(migrate_command)
+    app.cli.add_command(api_cache_stats_command)
+    app.cli.add_command(refresh_data_command)
+    app.cli.add_command(columnar_store_command)
+    app.cli.add_command(rebuild_aggregates_command)
+    app.cli.add_command(rebuild_indicators_command)
+
+    # The app still starts so that init-db and migrate themselves can run
+    check_schema_version(app.config['DATABASE'])
+    init_scheduler(app)
 
     return app
 
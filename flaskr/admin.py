@@ -1,6 +1,11 @@
-from flask import Blueprint, render_template, g, redirect, url_for, flash, request
+from flask import Blueprint, render_template, g, redirect, url_for, flash, request, jsonify
 from .db import get_db
-from datetime import datetime
+from .rate_limit import upstream_metrics
+from .api_cache import get_api_cache
+from .chart_cache import get_chart_cache
+from .aggregates import get_daily_volume
+from .history import day_range, fetch_transactions_page, parse_page_size, transaction_to_dict
+from datetime import date, datetime
 import json
 
 # Define the 'admin' blueprint with URL prefix '/admin'
@@ -17,21 +22,20 @@ def require_admin_role():
 def view_assets():
     # Establish a database connection
     db = get_db()
-    # Query to aggregate the total quantity of each symbol held across all users
+    # Per-symbol totals are maintained by every trade
     assets = db.execute(
-        'SELECT symbol, SUM(quantity) as total_quantity FROM user_assets GROUP BY symbol'
+        'SELECT symbol, total_quantity FROM symbol_holdings WHERE total_quantity > 0 ORDER BY symbol'
     ).fetchall()
     
     # Prepare asset data for display
     asset_data = [{'label': asset['symbol'], 'value': asset['total_quantity']} for asset in assets]
 
-    # Query to get user-specific stock positions
+    # user_assets holds one row per user and symbol, so positions need no aggregation
     asset_user_data = db.execute(
         '''
-        SELECT u.id as user_id, u.username, a.symbol, SUM(a.quantity) as total_quantity
+        SELECT u.id as user_id, u.username, a.symbol, a.quantity as total_quantity
         FROM user_assets a
         JOIN user_info u ON a.user_id = u.id
-        GROUP BY u.id, a.symbol
         ORDER BY u.username, a.symbol
         '''
     ).fetchall()
@@ -42,31 +46,17 @@ def view_assets():
         for asset in asset_user_data
     ]
 
-    transactions = []
-    search_date = None
-
-    # Handle POST request to filter transactions by date
-    if request.method == 'POST':
-        search_date = request.form.get('transaction_date')
-        transactions = db.execute(
-            '''
-            SELECT t.id, u.username, t.symbol, t.type, t.quantity, t.price, t.timestamp
-            FROM transactions_history t
-            JOIN user_info u ON t.user_id = u.id
-            WHERE DATE(t.timestamp) = ?
-            ORDER BY t.timestamp DESC
-            ''', (search_date,)
-        ).fetchall()
-    else:
-        # Get recent transactions for initial page load or when no date filter is applied
-        transactions = db.execute(
-            '''
-            SELECT t.id, u.username, t.symbol, t.type, t.quantity, t.price, t.timestamp
-            FROM transactions_history t
-            JOIN user_info u ON t.user_id = u.id
-            ORDER BY t.timestamp DESC
-            '''
-        ).fetchall()
+    # Filter transactions by an inclusive date range; GET so page links keep the filter
+    search_date = request.values.get('transaction_date') or None
+    end_date = request.values.get('end_date') or None
+    try:
+        since, until = day_range(search_date, end_date) if search_date else (None, None)
+        transactions, next_cursor = fetch_transactions_page(
+            db, since=since, until=until, cursor=request.args.get('cursor'), with_usernames=True)
+    except ValueError as e:
+        flash(str(e), 'error')
+        search_date = end_date = None
+        transactions, next_cursor = fetch_transactions_page(db, with_usernames=True)
 
     # Render the assets admin page with necessary data
     return render_template(
@@ -75,6 +65,54 @@ def view_assets():
         asset_user_data=formatted_asset_user_data,
         transactions=transactions,
         search_date=search_date,  # Include search date in the rendering context
+        end_date=end_date,
+        next_cursor=next_cursor,
         page_data={"title": 'Admin Assets Overview'}
     )
 
+
+@bp.route('/metrics')
+def metrics():
+    # Upstream quota usage and cache effectiveness, for monitoring
+    api_cache = get_api_cache()
+    data = upstream_metrics()
+    data['api_cache'] = api_cache.stats() if api_cache is not None else None
+    data['chart_cache'] = get_chart_cache().stats()
+    return jsonify(data)
+
+
+@bp.route('/api/transactions')
+def api_transactions():
+    """All users' transactions, newest first, optionally within start/end dates or for one user_id."""
+    try:
+        since, until = (day_range(request.args['start'], request.args.get('end'))
+                        if request.args.get('start') else (None, None))
+        rows, next_cursor = fetch_transactions_page(
+            get_db(),
+            user_id=request.args.get('user_id', type=int),
+            since=since,
+            until=until,
+            cursor=request.args.get('cursor'),
+            limit=parse_page_size(request.args.get('limit')),
+            with_usernames=True,
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'transactions': [transaction_to_dict(row) for row in rows], 'next_cursor': next_cursor})
+
+
+@bp.route('/api/daily_volume')
+@bp.route('/api/daily_volume/<symbol>')
+def api_daily_volume(symbol=None):
+    """Daily trade volume from the pre-aggregated table, for one symbol or all,
+    between optional inclusive start/end days."""
+    since = request.args.get('start') or None
+    until = request.args.get('end') or None
+    try:
+        for day in (since, until):
+            if day is not None:
+                date.fromisoformat(day)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    rows = get_daily_volume(get_db(), symbol, since, until)
+    return jsonify({'symbol': symbol, 'days': [dict(row) for row in rows]})
@@ -0,0 +1,99 @@
+import click
+from flask.cli import with_appcontext
+
+from .db import get_db
+
+
+def update_symbol_holding(db, symbol, quantity_delta, holders_delta=0):
+    """Apply a trade's change to the per-symbol totals, inside the trade's transaction."""
+    db.execute('''
+    INSERT INTO symbol_holdings (symbol, total_quantity, holders) VALUES (?, ?, ?)
+    ON CONFLICT(symbol) DO UPDATE SET
+        total_quantity = total_quantity + excluded.total_quantity,
+        holders = holders + excluded.holders
+    ''', (symbol, quantity_delta, holders_delta))
+    # Nobody holds the symbol any more
+    db.execute('DELETE FROM symbol_holdings WHERE symbol = ? AND holders <= 0', (symbol,))
+
+
+def record_daily_trade(db, symbol, type, quantity, price, timestamp):
+    """Add one trade to its symbol's daily volume row, inside the trade's transaction."""
+    value = quantity * float(price)
+    is_buy = type == 'BUY'
+    db.execute('''
+    INSERT INTO daily_trade_volume (symbol, day, buy_quantity, sell_quantity, buy_value, sell_value, trade_count)
+    VALUES (?, ?, ?, ?, ?, ?, 1)
+    ON CONFLICT(symbol, day) DO UPDATE SET
+        buy_quantity = buy_quantity + excluded.buy_quantity,
+        sell_quantity = sell_quantity + excluded.sell_quantity,
+        buy_value = buy_value + excluded.buy_value,
+        sell_value = sell_value + excluded.sell_value,
+        trade_count = trade_count + 1
+    ''', (symbol, timestamp[:10],
+          quantity if is_buy else 0, 0 if is_buy else quantity,
+          value if is_buy else 0.0, 0.0 if is_buy else value))
+
+
+def rebuild_aggregates(db):
+    """Recompute both summary tables from user_assets and transactions_history."""
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        db.execute('DELETE FROM symbol_holdings')
+        db.execute('''
+        INSERT INTO symbol_holdings (symbol, total_quantity, holders)
+        SELECT symbol, SUM(quantity), COUNT(*) FROM user_assets GROUP BY symbol
+        ''')
+        db.execute('DELETE FROM daily_trade_volume')
+        db.execute('''
+        INSERT INTO daily_trade_volume (symbol, day, buy_quantity, sell_quantity, buy_value, sell_value, trade_count)
+        SELECT symbol, DATE(timestamp),
+               SUM(CASE WHEN type = 'BUY' THEN quantity ELSE 0 END),
+               SUM(CASE WHEN type = 'SELL' THEN quantity ELSE 0 END),
+               SUM(CASE WHEN type = 'BUY' THEN quantity * price ELSE 0 END),
+               SUM(CASE WHEN type = 'SELL' THEN quantity * price ELSE 0 END),
+               COUNT(*)
+        FROM transactions_history
+        GROUP BY symbol, DATE(timestamp)
+        ''')
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+def get_daily_volume(db, symbol=None, since=None, until=None):
+    """Daily traded quantity, value and count, oldest first, for one symbol or summed over all.
+
+    `since` and `until` are inclusive 'YYYY-MM-DD' days, and days come back
+    in the same form rather than as the dates PARSE_DECLTYPES would make.
+    """
+    conditions, params = [], []
+    if symbol is not None:
+        conditions.append('symbol = ?')
+        params.append(symbol)
+    if since is not None:
+        conditions.append('day >= ?')
+        params.append(since)
+    if until is not None:
+        conditions.append('day <= ?')
+        params.append(until)
+    where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+    return db.execute(f'''
+    SELECT strftime('%Y-%m-%d', day) AS day, SUM(buy_quantity) AS buy_quantity, SUM(sell_quantity) AS sell_quantity,
+           SUM(buy_value) AS buy_value, SUM(sell_value) AS sell_value, SUM(trade_count) AS trade_count
+    FROM daily_trade_volume
+    {where}
+    GROUP BY day
+    ORDER BY day
+    ''', params).fetchall()
+
+
+@click.command('rebuild-aggregates')
+@with_appcontext
+def rebuild_aggregates_command():
+    """Recompute the admin dashboard's summary tables from the ledger."""
+    db = get_db()
+    rebuild_aggregates(db)
+    symbols = db.execute('SELECT COUNT(*) FROM symbol_holdings').fetchone()[0]
+    days = db.execute('SELECT COUNT(*) FROM daily_trade_volume').fetchone()[0]
+    click.echo(f'Rebuilt holdings for {symbols} symbols and {days} symbol-days of trade volume.')
@@ -0,0 +1,198 @@
+import numpy as np
+import pandas as pd
+
+from .db import get_connection
+from .columnar_store import get_columnar_store
+from .indicators import indicators_from_series, load_indicators
+
+BENCHMARK_SYMBOL = 'SPY'
+SERIES_COLUMNS = ['date', 'close', 'adjusted_close', 'simple_return', 'log_return', 'cumulative_return']
+
+
+class AnalyticsFrame:
+    """A symbol's and its benchmark's daily series, loaded once for every chart builder."""
+
+    def __init__(self, symbol, stock, index, benchmark=BENCHMARK_SYMBOL, db_path=None):
+        self.symbol = symbol
+        self.benchmark = benchmark
+        self.stock = stock
+        self.index = index
+        self.db_path = db_path
+        self._aligned = None
+        self._indicators = {}
+
+    @classmethod
+    def load(cls, db_path, symbol, benchmark=BENCHMARK_SYMBOL):
+        """Read both series from the columnar store, or with one query each."""
+        store = get_columnar_store()
+        if store is not None:
+            stock = store.read('stock_history', symbol)
+            index = store.read('index_data', benchmark)
+            if stock is not None and index is not None:
+                return cls(symbol, stock.to_frame(SERIES_COLUMNS), index.to_frame(SERIES_COLUMNS), benchmark, db_path)
+
+        columns = ', '.join(SERIES_COLUMNS)
+        with get_connection(db_path, readonly=True) as conn:
+            stock = pd.read_sql_query(
+                f'SELECT {columns} FROM stock_history WHERE symbol = ? ORDER BY date',
+                conn, params=(symbol,), parse_dates=['date'])
+            index = pd.read_sql_query(
+                f'SELECT {columns} FROM index_data WHERE symbol = ? ORDER BY date',
+                conn, params=(benchmark,), parse_dates=['date'])
+        return cls(symbol, stock, index, benchmark, db_path)
+
+    @property
+    def aligned(self):
+        """Stock and benchmark columns joined on the dates both have, suffixed _stock/_index."""
+        if self._aligned is None:
+            self._aligned = pd.merge(self.stock, self.index, on='date', suffixes=('_stock', '_index'))
+        return self._aligned
+
+    def indicators(self, which='stock'):
+        """Stored technical indicators of the stock or the benchmark ('index').
+
+        Falls back to computing them from the loaded series when ingestion
+        has not stored any yet.
+        """
+        if which not in self._indicators:
+            table_name, symbol, series = (('stock_history', self.symbol, self.stock) if which == 'stock'
+                                          else ('index_data', self.benchmark, self.index))
+            indicators = None
+            if self.db_path is not None:
+                with get_connection(self.db_path, readonly=True) as conn:
+                    indicators = load_indicators(conn, table_name, symbol)
+            if indicators is None or indicators.empty:
+                indicators = indicators_from_series(series)
+            self._indicators[which] = indicators
+        return self._indicators[which]
+
+
+BETA_WINDOW = 60
+TRADING_DAYS = 252
+
+
+def load_return_matrix(db_path, symbols, benchmark=BENCHMARK_SYMBOL):
+    """Daily simple returns of many symbols aligned to the benchmark's dates.
+
+    Returns (returns, benchmark returns, latest adjusted closes): a
+    dates x symbols DataFrame with NaN where a symbol has no bar, a Series
+    on the same dates, and a Series indexed by symbol.
+    """
+    store = get_columnar_store()
+    series = store.read_many('stock_history', symbols) if store is not None else None
+    index = store.read('index_data', benchmark) if store is not None else None
+    if series is not None and index is not None:
+        dates = pd.to_datetime(index.dates)
+        market = pd.Series(index['simple_return'], index=dates)
+        returns = pd.DataFrame({
+            symbol: pd.Series(values['simple_return'], index=pd.to_datetime(values.dates))
+            for symbol, values in series.items()
+        }, columns=list(symbols))
+        latest = pd.Series({symbol: values['adjusted_close'][-1] for symbol, values in series.items()})
+    else:
+        placeholders = ','.join('?' for _ in symbols)
+        with get_connection(db_path, readonly=True) as conn:
+            stock = pd.read_sql_query(
+                f'SELECT date, symbol, simple_return, adjusted_close FROM stock_history '
+                f'WHERE symbol IN ({placeholders}) ORDER BY date',
+                conn, params=list(symbols), parse_dates=['date'])
+            market = pd.read_sql_query(
+                'SELECT date, simple_return FROM index_data WHERE symbol = ? ORDER BY date',
+                conn, params=(benchmark,), parse_dates=['date'], index_col='date')['simple_return']
+        returns = stock.pivot(index='date', columns='symbol', values='simple_return').reindex(columns=list(symbols))
+        latest = stock.groupby('symbol')['adjusted_close'].last()
+    return returns.reindex(market.index), market, latest.reindex(list(symbols))
+
+
+def regression_statistics(returns, market):
+    """OLS of every column of `returns` (T x N) on `market` (T) in one pass.
+
+    Each column uses only the days where both it and the market have a
+    return. Returns a dict of length-N arrays: beta, annualized alpha,
+    r_squared, annualized tracking_error and observations.
+    """
+    mask = np.isfinite(returns) & np.isfinite(market)[:, None]
+    count = mask.sum(axis=0)
+    x = np.where(mask, market[:, None], 0.0)
+    y = np.where(mask, returns, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_x = x.sum(axis=0) / count
+        mean_y = y.sum(axis=0) / count
+        dx = np.where(mask, x - mean_x, 0.0)
+        dy = np.where(mask, y - mean_y, 0.0)
+        cov = (dx * dy).sum(axis=0)
+        var_x = (dx * dx).sum(axis=0)
+        var_y = (dy * dy).sum(axis=0)
+        beta = cov / var_x
+        alpha = (mean_y - beta * mean_x) * TRADING_DAYS
+        r_squared = cov ** 2 / (var_x * var_y)
+        active = np.where(mask, y - x, 0.0)
+        active_mean = active.sum(axis=0) / count
+        tracking_variance = (np.where(mask, active - active_mean, 0.0) ** 2).sum(axis=0) / (count - 1)
+        tracking_error = np.sqrt(tracking_variance * TRADING_DAYS)
+    return {
+        'beta': beta,
+        'alpha': alpha,
+        'r_squared': r_squared,
+        'tracking_error': tracking_error,
+        'observations': count,
+    }
+
+
+def rolling_betas(returns, market, window=BETA_WINDOW):
+    """Beta of every column over trailing `window`-day windows, from cumulative sums.
+
+    Returns a T x N array, NaN until a window holds `window` paired returns.
+    """
+    mask = np.isfinite(returns) & np.isfinite(market)[:, None]
+    x = np.where(mask, market[:, None], 0.0)
+    y = np.where(mask, returns, 0.0)
+
+    def window_sums(values):
+        # Prepend a zero row so each window is a difference of two cumulative sums
+        sums = np.cumsum(np.vstack([np.zeros((1, values.shape[1])), values]), axis=0)
+        totals = sums[1:].copy()
+        totals[window:] -= sums[1:-window]
+        return totals
+
+    n = window_sums(mask.astype(float))
+    sx, sy = window_sums(x), window_sums(y)
+    sxy, sxx = window_sums(x * y), window_sums(x * x)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        beta = (n * sxy - sx * sy) / (n * sxx - sx ** 2)
+    beta[n < window] = np.nan
+    return beta
+
+
+def compute_beta_report(db_path, symbols, window=BETA_WINDOW, benchmark=BENCHMARK_SYMBOL):
+    """Beta, alpha, R², tracking error and rolling betas of many symbols against the benchmark."""
+    returns, market, latest = load_return_matrix(db_path, symbols, benchmark)
+    returns_values = returns.to_numpy(dtype=float)
+    market_values = market.to_numpy(dtype=float)
+    statistics = regression_statistics(returns_values, market_values)
+    rolling = rolling_betas(returns_values, market_values, window)
+    return {
+        'benchmark': benchmark,
+        'as_of': market.index[-1].strftime('%Y-%m-%d') if len(market) else None,
+        'symbols': {
+            symbol: {name: values[i].item() for name, values in statistics.items()}
+            for i, symbol in enumerate(symbols)
+        },
+        'latest_price': {symbol: float(price) for symbol, price in latest.items()},
+        'rolling': {
+            'window': window,
+            'dates': market.index.strftime('%Y-%m-%d').tolist(),
+            'betas': {symbol: rolling[:, i] for i, symbol in enumerate(symbols)},
+        },
+    }
+
+
+def portfolio_beta(report, holdings):
+    """Value-weighted beta of `holdings` ({symbol: quantity}) using a beta report."""
+    values = {symbol: quantity * report['latest_price'][symbol] for symbol, quantity in holdings.items()
+              if np.isfinite(report['latest_price'].get(symbol, np.nan))
+              and np.isfinite(report['symbols'].get(symbol, {}).get('beta', np.nan))}
+    total = sum(values.values())
+    if not total:
+        return None
+    return sum(value * report['symbols'][symbol]['beta'] for symbol, value in values.items()) / total
@@ -0,0 +1,120 @@
+import hashlib
+
+from flask import Blueprint, current_app, g, jsonify, request, session
+
+from .analytics import BENCHMARK_SYMBOL, BETA_WINDOW, AnalyticsFrame, compute_beta_report, portfolio_beta
+from .auth import login_required
+from .chart_cache import get_chart_cache, get_data_version, get_ingestion_generations
+from .chart_encoding import dumps
+from .db import get_db
+from .downsample import parse_max_points
+from .ef_data_prep import StatisticsCache, get_data_version as get_symbols_data_version
+from .history import fetch_transactions_page, parse_page_size, transaction_to_dict
+from .plot import CHARTS, build_chart
+from .rate_limit import SingleFlight
+
+# JSON endpoints for the pages
+bp = Blueprint('api', __name__, url_prefix='/api')
+
+# Charts of one page are requested together; they share a single frame load
+frame_flight = SingleFlight()
+
+# Beta reports keyed by the set of held symbols; replaced when their bars change
+beta_cache = StatisticsCache(max_entries=16)
+
+
+@bp.route('/transactions')
+@login_required
+def transactions():
+    """The user's transactions, newest first; follow `next_cursor` for older pages."""
+    try:
+        rows, next_cursor = fetch_transactions_page(
+            get_db(),
+            user_id=session.get('user_id'),
+            cursor=request.args.get('cursor'),
+            limit=parse_page_size(request.args.get('limit')),
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'transactions': [transaction_to_dict(row) for row in rows], 'next_cursor': next_cursor})
+
+
+@bp.route('/plot/<symbol>')
+def plot_charts(symbol):
+    """Names of the charts available for a symbol, in page order."""
+    return jsonify({'symbol': symbol, 'charts': list(CHARTS)})
+
+
+@bp.route('/plot/<symbol>/<chart>')
+def plot_chart(symbol, chart):
+    """One chart's figure JSON, built on first request and cached per data version.
+
+    `max_points` caps the points of each time series (LTTB downsampling).
+    """
+    if chart not in CHARTS:
+        return jsonify({'error': f'Unknown chart: {chart}'}), 404
+    version = get_data_version(get_db(), symbol)
+    if None in version:
+        return jsonify({'error': f'No price history for {symbol}.'}), 404
+
+    # Clients ask for about one point per pixel of the chart's width
+    max_points = parse_max_points(request.args.get('max_points'), current_app.config['CHART_MAX_POINTS'])
+    cache_key = (symbol, chart, max_points) + version
+    etag = hashlib.sha1(repr(cache_key).encode()).hexdigest()
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+    else:
+        chart_cache = get_chart_cache()
+        payload = chart_cache.get(cache_key)
+        if payload is None:
+            db_path = current_app.config['DATABASE']
+            frame = frame_flight.do((symbol,) + version, lambda: AnalyticsFrame.load(db_path, symbol))
+            payload = build_chart(frame, chart, max_points)
+            chart_cache.set(cache_key, payload)
+        response = current_app.response_class(payload, mimetype='application/json')
+    # Browsers revalidate, and get a 304 until new bars arrive
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+
+@bp.route('/betas')
+@login_required
+def betas():
+    """Beta, alpha, R², tracking error and rolling betas against SPY.
+
+    One vectorized report covers every symbol held by any user; admins see
+    all of them, other users their own holdings. `window` sets the rolling
+    window in days and rolling=0 leaves the rolling series out.
+    """
+    window = max(20, min(request.args.get('window', BETA_WINDOW, type=int), 252))
+    db = get_db()
+    symbols = tuple(sorted(row[0] for row in db.execute('SELECT DISTINCT symbol FROM user_assets')))
+    holdings = {row['symbol']: row['quantity'] for row in db.execute(
+        'SELECT symbol, quantity FROM user_assets WHERE user_id = ?', (session.get('user_id'),))}
+    if not symbols:
+        return jsonify({'benchmark': BENCHMARK_SYMBOL, 'symbols': {}, 'portfolio_beta': None})
+
+    benchmark_date = db.execute('SELECT MAX(date) FROM index_data WHERE symbol = ?', (BENCHMARK_SYMBOL,)).fetchone()[0]
+    version = (window, benchmark_date) + get_ingestion_generations(db, 'index_data', [BENCHMARK_SYMBOL]) \
+        + get_symbols_data_version(db, symbols)
+    report = beta_cache.get(symbols, version)
+    if report is None:
+        report = compute_beta_report(current_app.config['DATABASE'], symbols, window)
+        beta_cache.set(symbols, version, report)
+
+    visible = symbols if g.role == 'admin' else sorted(holdings)
+    result = {
+        'benchmark': report['benchmark'],
+        'as_of': report['as_of'],
+        'symbols': {symbol: report['symbols'][symbol] for symbol in visible},
+        'portfolio_beta': portfolio_beta(report, holdings),
+    }
+    if request.args.get('rolling') != '0':
+        rolling = report['rolling']
+        result['rolling'] = {
+            'window': rolling['window'],
+            'dates': rolling['dates'],
+            'betas': {symbol: rolling['betas'][symbol] for symbol in visible},
+        }
+    return current_app.response_class(dumps(result), mimetype='application/json')
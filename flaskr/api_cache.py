@@ -0,0 +1,181 @@
+import json
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import click
+from flask import current_app, has_app_context
+from flask.cli import with_appcontext
+
+from .db import get_connection
+
+MARKET_TZ = ZoneInfo('America/New_York')
+# Alpha Vantage publishes the daily bar a little after the 16:00 close
+MARKET_CLOSE_HOUR = 16
+MARKET_CLOSE_GRACE = timedelta(minutes=30)
+
+# Time-to-live in seconds for each Alpha Vantage function. None means
+# "valid until the next market close".
+DEFAULT_TTLS = {
+    'TIME_SERIES_DAILY_ADJUSTED': None,
+    'TIME_SERIES_INTRADAY': 60,
+    'OVERVIEW': 24 * 60 * 60,
+    'NEWS_SENTIMENT': 5 * 60,
+}
+FALLBACK_TTL = 5 * 60
+
+
+def seconds_until_next_close(now=None):
+    """Seconds from now until the next weekday market close (plus grace period)."""
+    now = now or datetime.now(MARKET_TZ)
+    close = now.replace(hour=MARKET_CLOSE_HOUR, minute=0, second=0, microsecond=0) + MARKET_CLOSE_GRACE
+    if now >= close:
+        close += timedelta(days=1)
+    while close.weekday() >= 5:
+        close += timedelta(days=1)
+    return max((close - now).total_seconds(), 1)
+
+
+def last_published_date(now=None):
+    """Date (YYYY-MM-DD) of the newest daily bar Alpha Vantage should have; holidays are not known."""
+    now = now or datetime.now(MARKET_TZ)
+    close = now.replace(hour=MARKET_CLOSE_HOUR, minute=0, second=0, microsecond=0) + MARKET_CLOSE_GRACE
+    day = now.date() if now >= close else now.date() - timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day.strftime('%Y-%m-%d')
+
+
+class ResponseCache:
+    """Size-bounded, on-disk TTL cache for upstream JSON payloads.
+
+    Entries are keyed on (function, symbol, outputsize) and stored in a
+    small SQLite file next to the application database.
+    """
+
+    def __init__(self, path, max_bytes=64 * 1024 * 1024, ttls=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        with self._connect() as conn:
+            conn.executescript('''
+            CREATE TABLE IF NOT EXISTS api_cache (
+                function TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                outputsize TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (function, symbol, outputsize)
+            );
+            CREATE INDEX IF NOT EXISTS idx_api_cache_accessed ON api_cache (accessed_at);
+            CREATE TABLE IF NOT EXISTS api_cache_stats (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0
+            );
+            INSERT OR IGNORE INTO api_cache_stats (name, value) VALUES ('hits', 0), ('misses', 0), ('evictions', 0);
+            ''')
+
+    def _connect(self):
+        return get_connection(self.path)
+
+    def ttl_for(self, function):
+        ttl = self.ttls.get(function, FALLBACK_TTL)
+        return seconds_until_next_close() if ttl is None else ttl
+
+    def _count(self, conn, name, amount=1):
+        conn.execute('UPDATE api_cache_stats SET value = value + ? WHERE name = ?', (amount, name))
+
+    def get(self, function, symbol, outputsize=''):
+        """Return the cached payload, or None if it is missing or expired."""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT payload FROM api_cache WHERE function = ? AND symbol = ? AND outputsize = ? AND expires_at > ?',
+                (function, symbol, outputsize, now)
+            ).fetchone()
+            if row is None:
+                self._count(conn, 'misses')
+                return None
+            conn.execute(
+                'UPDATE api_cache SET accessed_at = ? WHERE function = ? AND symbol = ? AND outputsize = ?',
+                (now, function, symbol, outputsize)
+            )
+            self._count(conn, 'hits')
+        return json.loads(row[0])
+
+    def set(self, function, symbol, outputsize, payload):
+        """Store a payload and evict least recently used entries past the size bound."""
+        now = time.time()
+        text = json.dumps(payload)
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO api_cache (function, symbol, outputsize, payload, size, expires_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (function, symbol, outputsize, text, len(text), now + self.ttl_for(function), now)
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute('DELETE FROM api_cache WHERE expires_at <= ?', (now,))
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM api_cache').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for function, symbol, outputsize, size in conn.execute(
+                'SELECT function, symbol, outputsize, size FROM api_cache ORDER BY accessed_at').fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute('DELETE FROM api_cache WHERE function = ? AND symbol = ? AND outputsize = ?',
+                         (function, symbol, outputsize))
+            total -= size
+            evicted += 1
+        self._count(conn, 'evictions', evicted)
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM api_cache')
+            conn.execute('UPDATE api_cache_stats SET value = 0')
+
+    def stats(self):
+        """Return hit/miss/eviction counters and the current cache size."""
+        with self._connect() as conn:
+            counters = dict(conn.execute('SELECT name, value FROM api_cache_stats').fetchall())
+            entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM api_cache').fetchone()
+        lookups = counters.get('hits', 0) + counters.get('misses', 0)
+        counters.update({
+            'entries': entries,
+            'bytes': size,
+            'hit_rate': counters.get('hits', 0) / lookups if lookups else 0.0,
+        })
+        return counters
+
+
+_caches = {}
+
+
+def get_api_cache():
+    """Return the cache configured for the current app, or None outside an app context."""
+    if not has_app_context() or not current_app.config.get('API_CACHE'):
+        return None
+    path = current_app.config['API_CACHE']
+    if path not in _caches:
+        _caches[path] = ResponseCache(path, max_bytes=current_app.config.get('API_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    return _caches[path]
+
+
+@click.command('api-cache-stats')
+@click.option('--clear', is_flag=True, help='Drop all cached responses and reset the counters.')
+@with_appcontext
+def api_cache_stats_command(clear):
+    """Report Alpha Vantage response cache hit/miss counts."""
+    cache = get_api_cache()
+    if cache is None:
+        click.echo('The API response cache is disabled.')
+        return
+    if clear:
+        cache.clear()
+        click.echo('Cleared the API response cache.')
+    for name, value in cache.stats().items():
+        click.echo(f'{name}: {value}')
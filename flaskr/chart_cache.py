@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from .analytics import BENCHMARK_SYMBOL
+
+
+class ChartCache:
+    """In-memory LRU cache of serialized chart payloads with a TTL and a byte cap.
+
+    Keys start with the symbol and chart name, followed by the data version
+    the chart was built from, so new bars never hit a stale entry.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl=60 * 60):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, payload):
+        """Cache one serialized chart; entries larger than the cap are not stored."""
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (time.monotonic() + self.ttl, payload, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def invalidate(self, symbol=None):
+        """Drop entries for a symbol, or every entry when the benchmark or nothing is given."""
+        with self.lock:
+            if symbol is None or symbol == BENCHMARK_SYMBOL:
+                self.entries.clear()
+                self.size = 0
+                return
+            for key in [key for key in self.entries if key[0] == symbol]:
+                self._remove(key)
+
+    def _remove(self, key):
+        self.size -= self.entries.pop(key)[2]
+
+    def stats(self):
+        return {'entries': len(self.entries), 'bytes': self.size, 'hits': self.hits, 'misses': self.misses}
+
+
+_chart_cache = None
+
+
+def get_chart_cache():
+    """Return the process-wide chart cache, sized from the app config on first use."""
+    global _chart_cache
+    if _chart_cache is None:
+        _chart_cache = ChartCache(max_bytes=current_app.config['CHART_CACHE_MAX_BYTES'],
+                                  ttl=current_app.config['CHART_CACHE_TTL'])
+    return _chart_cache
+
+
+def invalidate_charts(symbol=None):
+    """Called by ingestion after it writes bars for a symbol."""
+    if _chart_cache is not None:
+        _chart_cache.invalidate(symbol)
+
+
+def get_ingestion_generations(conn, table_name, symbols):
+    """Write generation of each symbol's bars (0 if never recorded), in `symbols` order.
+
+    Ingestion bumps it on every change, in any process, so it belongs in
+    every version key derived from stored bars.
+    """
+    placeholders = ','.join('?' for _ in symbols)
+    rows = conn.execute(
+        f'SELECT symbol, generation FROM ingestion_state WHERE table_name = ? AND symbol IN ({placeholders})',
+        (table_name, *symbols)
+    ).fetchall()
+    generations = {row[0]: row[1] for row in rows}
+    return tuple(generations.get(symbol, 0) for symbol in symbols)
+
+
+def get_data_version(db, symbol, benchmark=BENCHMARK_SYMBOL):
+    """Latest bar date of the symbol and of the benchmark, then their write generations."""
+    stock = db.execute('SELECT MAX(date) FROM stock_history WHERE symbol = ?', (symbol,)).fetchone()[0]
+    index = db.execute('SELECT MAX(date) FROM index_data WHERE symbol = ?', (benchmark,)).fetchone()[0]
+    return (stock, index) + get_ingestion_generations(db, 'stock_history', [symbol]) \
+        + get_ingestion_generations(db, 'index_data', [benchmark])
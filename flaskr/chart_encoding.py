@@ -0,0 +1,146 @@
+import base64
+import json
+from datetime import date
+
+import numpy as np
+from plotly.utils import PlotlyJSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional; the standard encoder is used instead
+    orjson = None
+
+# Trace attributes smaller than this stay plain JSON lists
+MIN_TYPED_ARRAY_LENGTH = 16
+INT32 = np.iinfo(np.int32)
+
+
+def typed_array(values, dtype):
+    """A plotly.js (>= 2.28) typed array spec: base64 of the little-endian buffer."""
+    buffer = np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder('<'))
+    return {'dtype': dtype, 'bdata': base64.b64encode(buffer).decode('ascii')}
+
+
+def as_datetime64(values):
+    """datetime64[ms] view of a date array, or None if it holds something else."""
+    if values.dtype.kind == 'M':
+        return values.astype('datetime64[ms]')
+    if values.dtype.kind == 'O' and len(values) and isinstance(values[0], date):
+        # plotly turns datetime Series into object arrays of datetimes
+        try:
+            return values.astype('datetime64[ms]')
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def encode_array(values):
+    """Encode one data array, returning (payload, is_date).
+
+    Floats go out as float32 with NaN marking the gaps, integers as int32
+    when they fit, and dates as float64 milliseconds since the epoch. Other
+    arrays are left to the JSON encoder.
+    """
+    if values.ndim != 1 or len(values) < MIN_TYPED_ARRAY_LENGTH:
+        return values, False
+    kind = values.dtype.kind
+    if kind == 'f':
+        return typed_array(values, 'f4'), False
+    if kind in 'iu':
+        if INT32.min <= values.min() and values.max() <= INT32.max:
+            return typed_array(values, 'i4'), False
+        return typed_array(values, 'f8'), False
+    if kind == 'b':
+        return values, False
+    dates = as_datetime64(values)
+    if dates is not None:
+        milliseconds = dates.astype('int64').astype('float64')
+        milliseconds[np.isnat(dates)] = np.nan
+        return typed_array(milliseconds, 'f8'), True
+    return values, False
+
+
+def as_array(value):
+    """The numeric array behind a trace value, or None for anything else.
+
+    Accepts numpy arrays, lists and tuples, and typed array specs (plotly
+    >= 6 may already hold float64 ones, which are decoded so they can be
+    narrowed).
+    """
+    if isinstance(value, dict) and 'bdata' in value and 'dtype' in value:
+        if 'shape' in value:
+            return None
+        buffer = base64.b64decode(value['bdata'])
+        return np.frombuffer(buffer, dtype=np.dtype(value['dtype']).newbyteorder('<'))
+    if isinstance(value, (list, tuple)):
+        if len(value) < MIN_TYPED_ARRAY_LENGTH:
+            return None
+        value = np.asarray(value)
+    return value if isinstance(value, np.ndarray) else None
+
+
+def encode_value(value):
+    """Encode one trace value if it is an array, returning (payload, is_date)."""
+    array = as_array(value)
+    if array is None:
+        return value, False
+    payload, is_date = encode_array(array)
+    # Arrays the encoder leaves alone go out as they came in
+    return (value, False) if payload is array else (payload, is_date)
+
+
+def encode_trace(trace):
+    """Copy a trace dict with its arrays, and those of nested attributes such as marker, encoded.
+
+    Returns (trace, names of the axes that now carry numeric dates).
+    """
+    encoded, date_axes = {}, []
+    for key, value in trace.items():
+        if isinstance(value, dict) and 'bdata' not in value:
+            value = {name: encode_value(item)[0] for name, item in value.items()}
+        else:
+            value, is_date = encode_value(value)
+            if is_date and key in ('x', 'y'):
+                date_axes.append(trace.get(f'{key}axis', key))
+        encoded[key] = value
+    return encoded, date_axes
+
+
+def encode_figure(fig):
+    """Figure as a JSON-ready dict with numeric arrays sent as typed arrays.
+
+    Trace values are read from the figure's own property dicts instead of a
+    to_plotly_json() deep copy, so float arrays are narrowed to float32
+    whichever form plotly stores them in. Only the small layout is copied.
+    """
+    layout = fig.layout.to_plotly_json()
+    data = []
+    for trace in fig.data:
+        # _props is the trace's validated property dict, shared with the figure
+        trace, date_axes = encode_trace(trace._props)
+        data.append(trace)
+        for axis in date_axes:
+            # Numeric x values would otherwise make plotly pick a linear axis
+            name = f'{axis[0]}axis{axis[1:]}'
+            layout[name] = dict(layout.get(name, {}), type='date')
+    return {'data': data, 'layout': layout}
+
+
+def _default(obj):
+    return PlotlyJSONEncoder().default(obj)
+
+
+def dumps(obj):
+    """Serialize with orjson when it is installed (NaN becomes null either way).
+
+    '<', '>' and '&' are escaped so the result can be embedded in a page.
+    """
+    if orjson is not None:
+        text = orjson.dumps(obj, default=_default, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    else:
+        text = json.dumps(obj, cls=PlotlyJSONEncoder)
+    return text.replace('<', '\\u003c').replace('>', '\\u003e').replace('&', '\\u0026')
+
+
+def figure_to_json(fig):
+    return dumps(encode_figure(fig))
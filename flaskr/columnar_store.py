@@ -0,0 +1,171 @@
+import os
+import threading
+
+import click
+import numpy as np
+import pandas as pd
+from flask import current_app, has_app_context
+from flask.cli import with_appcontext
+
+from .db import get_connection
+
+# Row order of each symbol's array; 'date' holds days since 1970-01-01
+STORE_COLUMNS = ['date', 'open', 'high', 'low', 'close', 'volume', 'adjusted_close',
+                 'simple_return', 'log_return', 'cumulative_return']
+STORE_TABLES = ('stock_history', 'index_data')
+
+
+class ColumnarSeries:
+    """Read-only view of one symbol's stored columns.
+
+    `values` is a memory-mapped (len(STORE_COLUMNS), n) float64 array, so
+    every column is a contiguous row that is sliced without copying.
+    """
+
+    def __init__(self, values):
+        self.values = values
+
+    def __len__(self):
+        return self.values.shape[1]
+
+    def __getitem__(self, name):
+        return self.values[STORE_COLUMNS.index(name)]
+
+    @property
+    def days(self):
+        return self['date']
+
+    @property
+    def dates(self):
+        """Dates as datetime64[D] (the one column that is converted)."""
+        return self.days.astype('int64').astype('datetime64[D]')
+
+    def to_frame(self, columns):
+        """A DataFrame over the requested columns, with 'date' as timestamps."""
+        data = {}
+        for name in columns:
+            data[name] = pd.to_datetime(self.dates) if name == 'date' else self[name]
+        return pd.DataFrame(data, copy=False)
+
+
+class ColumnarStore:
+    """Per-symbol price columns kept as .npy files next to the database.
+
+    Files are rewritten whole and swapped in with os.replace, so a reader
+    never sees a partly written series; an open memmap keeps the old file
+    alive until it is dropped.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.lock = threading.Lock()
+        self.mapped = {}
+
+    def path(self, table_name, symbol):
+        if table_name not in STORE_TABLES:
+            raise ValueError(f'Unknown price table: {table_name}')
+        return os.path.join(self.root, table_name, f'{symbol}.npy')
+
+    def write(self, table_name, symbol, values):
+        path = self.path(table_name, symbol)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(values, dtype=np.float64))
+        os.replace(tmp_path, path)
+
+    def export_symbol(self, conn, table_name, symbol):
+        """Rewrite a symbol's file from the rows stored in SQLite. Returns the number of bars."""
+        if table_name not in STORE_TABLES:
+            raise ValueError(f'Unknown price table: {table_name}')
+        rows = conn.execute(
+            f'SELECT {", ".join(STORE_COLUMNS)} FROM {table_name} WHERE symbol = ? ORDER BY date',
+            (symbol,)
+        ).fetchall()
+        if not rows:
+            self.remove(table_name, symbol)
+            return 0
+        dates, *columns = zip(*rows)
+        values = np.empty((len(STORE_COLUMNS), len(rows)))
+        values[0] = np.array([date[:10] for date in dates], dtype='datetime64[D]').astype('int64')
+        # NULLs become NaN
+        values[1:] = np.array(columns, dtype=float)
+        self.write(table_name, symbol, values)
+        return len(rows)
+
+    def remove(self, table_name, symbol):
+        try:
+            os.remove(self.path(table_name, symbol))
+        except FileNotFoundError:
+            pass
+
+    def read(self, table_name, symbol):
+        """Return a ColumnarSeries, or None when the symbol has not been exported."""
+        path = self.path(table_name, symbol)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            entry = self.mapped.get(path)
+            if entry is not None and entry[0] == signature:
+                return entry[1]
+        series = ColumnarSeries(np.load(path, mmap_mode='r'))
+        with self.lock:
+            self.mapped[path] = (signature, series)
+        return series
+
+    def read_many(self, table_name, symbols):
+        """Map every symbol to its series; None if any of them is missing."""
+        series = {symbol: self.read(table_name, symbol) for symbol in symbols}
+        if any(value is None for value in series.values()):
+            return None
+        return series
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_columnar_store():
+    """The store configured by COLUMNAR_STORE, or None when it is disabled."""
+    if not has_app_context():
+        return None
+    root = current_app.config.get('COLUMNAR_STORE')
+    if not root:
+        return None
+    with _stores_lock:
+        if root not in _stores:
+            _stores[root] = ColumnarStore(root)
+        return _stores[root]
+
+
+def export_symbols(db_path, table_name, symbols):
+    """Refresh the columnar copies of the given symbols after their bars changed."""
+    store = get_columnar_store()
+    if store is None:
+        return
+    with get_connection(db_path, readonly=True) as conn:
+        for symbol in symbols:
+            store.export_symbol(conn, table_name, symbol)
+
+
+@click.command('columnar-store')
+@click.option('--rebuild', is_flag=True, help='Export every stored symbol again.')
+@with_appcontext
+def columnar_store_command(rebuild):
+    """Show or rebuild the memory-mapped price store."""
+    store = get_columnar_store()
+    if store is None:
+        click.echo('COLUMNAR_STORE is not configured.')
+        return
+    with get_connection(current_app.config['DATABASE'], readonly=True) as conn:
+        for table_name in STORE_TABLES:
+            symbols = [row[0] for row in conn.execute(f'SELECT DISTINCT symbol FROM {table_name}')]
+            if rebuild:
+                bars = sum(store.export_symbol(conn, table_name, symbol) for symbol in symbols)
+                click.echo(f'{table_name}: exported {len(symbols)} symbols, {bars} bars.')
+            else:
+                exported = sum(os.path.exists(store.path(table_name, symbol)) for symbol in symbols)
+                click.echo(f'{table_name}: {exported} of {len(symbols)} symbols exported.')
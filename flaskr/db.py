@@ -1,9 +1,64 @@
 import sqlite3
+import threading
 
 import click
 from flask import current_app
 from flask import g
 
+# Applied to every connection. WAL lets readers run alongside the writer;
+# NORMAL sync is durable across application crashes in WAL mode.
+SQLITE_PRAGMAS = {
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -64000,  # KiB, i.e. 64 MB of page cache per connection
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+STATEMENT_CACHE_SIZE = 256
+
+_local = threading.local()
+
+
+def _open_connection(db_path, readonly, rows):
+    if readonly:
+        conn = sqlite3.connect(
+            f"file:{db_path}?mode=ro", uri=True, check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            detect_types=sqlite3.PARSE_DECLTYPES if rows else 0,
+        )
+    else:
+        conn = sqlite3.connect(
+            db_path, check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            detect_types=sqlite3.PARSE_DECLTYPES if rows else 0,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+    for name, value in SQLITE_PRAGMAS.items():
+        conn.execute(f"PRAGMA {name}={value}")
+    if rows:
+        conn.row_factory = sqlite3.Row
+    return conn
+
+
+def get_connection(db_path, readonly=False, rows=False):
+    """Return this thread's long-lived connection to a database.
+
+    Connections are opened once per thread and kept, so their prepared
+    statement cache survives between calls. `readonly` connections are
+    opened with mode=ro and are meant for analytics reads; `rows`
+    connections return sqlite3.Row objects and parse declared types.
+    Use the connection as a context manager to commit or roll back; do
+    not close it.
+    """
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    key = (db_path, readonly, rows)
+    conn = connections.get(key)
+    if conn is None:
+        conn = connections[key] = _open_connection(db_path, readonly, rows)
+    return conn
+
 
 def get_db():
     """Connect to the application's configured database. The connection
@@ -11,22 +66,20 @@ def get_db():
     again.
     """
     if "db" not in g:
-        g.db = sqlite3.connect(
-            current_app.config["DATABASE"], detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        g.db.row_factory = sqlite3.Row
+        g.db = get_connection(current_app.config["DATABASE"], rows=True)
 
     return g.db
 
 
 def close_db(e=None):
-    """If this request connected to the database, close the
-    connection.
+    """If this request used the database, roll back anything it left
+    uncommitted. The connection itself stays open for the thread's next
+    request.
     """
     db = g.pop("db", None)
 
-    if db is not None:
-        db.close()
+    if db is not None and db.in_transaction:
+        db.rollback()
 
 
 def init_db():
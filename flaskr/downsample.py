@@ -0,0 +1,95 @@
+import numpy as np
+
+from .chart_encoding import as_datetime64
+
+# Bounds and granularity of the max_points chart parameter; rounding keeps
+# the number of cached variants per chart small
+MIN_POINTS = 100
+MAX_POINTS = 20000
+POINTS_STEP = 250
+
+
+def parse_max_points(value, default=None):
+    """Validate a max_points request value; None or garbage gives `default`."""
+    try:
+        points = int(value)
+    except (TypeError, ValueError):
+        return default
+    points = -(-points // POINTS_STEP) * POINTS_STEP
+    return max(MIN_POINTS, min(points, MAX_POINTS))
+
+
+def lttb_indices(x, y, threshold):
+    """Indices of the points Largest-Triangle-Three-Buckets keeps.
+
+    `x` must be ascending and both arrays finite. The first and last points
+    are always kept; each bucket in between contributes the point forming
+    the largest triangle with the previous pick and the next bucket's mean.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.intp)
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        mean_x, mean_y = x[end:next_end].mean(), y[end:next_end].mean()
+        area = np.abs((x[a] - mean_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (mean_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y, threshold):
+    """Indices of each bucket's minimum and maximum, in order; suits marker series."""
+    n = len(y)
+    if threshold >= n or threshold < 2:
+        return np.arange(n)
+    picks = []
+    for bucket in np.array_split(np.arange(n), threshold // 2):
+        values = y[bucket]
+        picks.extend((bucket[np.argmin(values)], bucket[np.argmax(values)]))
+    return np.unique(picks)
+
+
+def numeric_x(values):
+    """Ascending float x values of a trace, or None when it is not a sortable series."""
+    values = np.asarray(values)
+    dates = as_datetime64(values)
+    if dates is not None:
+        if np.isnat(dates).any():
+            return None
+        values = dates.astype('int64')
+    elif values.dtype.kind not in 'iuf':
+        return None
+    values = values.astype(float)
+    if not np.all(np.diff(values) >= 0):
+        return None
+    return values
+
+
+def downsample_figure(fig, max_points):
+    """Cap every time-series trace of a figure at `max_points` points, in place.
+
+    Line traces are reduced with LTTB and marker traces with min/max
+    decimation. Traces whose x is not ascending (e.g. return scatter
+    plots) are left alone. NaN points are dropped from reduced traces.
+    """
+    for trace in fig.data:
+        if trace.type != 'scatter' or trace.x is None or trace.y is None or len(trace.x) <= max_points:
+            continue
+        x = numeric_x(trace.x)
+        if x is None:
+            continue
+        y = np.asarray(trace.y, dtype=float)
+        finite = np.flatnonzero(np.isfinite(y))
+        if 'lines' in (trace.mode or 'lines'):
+            keep = lttb_indices(x[finite], y[finite], max_points)
+        else:
+            keep = minmax_indices(y[finite], max_points)
+        keep = finite[keep]
+        trace.update(x=np.asarray(trace.x)[keep], y=y[keep])
+    return fig
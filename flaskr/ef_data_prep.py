@@ -3,6 +3,93 @@ import numpy as np
 import scipy.optimize as sco
 import sqlite3
 import json
+import threading
+from collections import OrderedDict
+from .db import get_connection
+from .columnar_store import get_columnar_store
+from .chart_cache import get_ingestion_generations
+
+def get_data_version(conn, symbols):
+    """Latest date of the symbols' history and their write generations.
+
+    The generations are bumped by ingestion in whichever process writes, so
+    revisions and trims that keep the latest date still change the version.
+    """
+    query = "SELECT MAX(date) FROM stock_history WHERE symbol IN ({})"
+    query = query.format(','.join('?' for _ in symbols))
+    latest = conn.execute(query, symbols).fetchone()[0]
+    return (latest,) + get_ingestion_generations(conn, 'stock_history', symbols)
+
+
+def load_return_statistics(conn, symbols):
+    """Reads the symbols' history and returns (prices, returns, mean_returns, cov_matrix)."""
+    query = "SELECT date, symbol, adjusted_close FROM stock_history WHERE symbol IN ({})"
+    query = query.format(','.join('?' for _ in symbols))  # Create placeholders
+    df = pd.read_sql_query(query, conn, params=symbols, parse_dates=['date'], index_col='date')
+
+    # Pivot the DataFrame to have dates as index and symbols as columns with their adjusted close prices
+    data = df.pivot(columns='symbol', values='adjusted_close')
+    returns = data.pct_change().dropna()
+    return data, returns, returns.mean(), returns.cov()
+
+
+def load_stored_return_statistics(store, symbols):
+    """Same as load_return_statistics, built from the columnar store's arrays.
+
+    Returns None if any of the symbols has not been exported.
+    """
+    series = store.read_many('stock_history', symbols)
+    if series is None:
+        return None
+    data = pd.concat(
+        {symbol: pd.Series(values['adjusted_close'], index=pd.to_datetime(values.dates)) for symbol, values in series.items()},
+        axis=1
+    )
+    data.index.name = 'date'
+    data.columns.name = 'symbol'
+    returns = data.pct_change().dropna()
+    return data, returns, returns.mean(), returns.cov()
+
+
+class StatisticsCache:
+    """LRU cache of return statistics keyed by symbol set.
+
+    Users holding the same symbols share an entry; an entry is replaced
+    as soon as the stored data version for its symbols changes.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, symbols, version):
+        with self.lock:
+            entry = self.entries.get(symbols)
+            if entry is None or entry[0] != version:
+                return None
+            self.entries.move_to_end(symbols)
+            return entry[1]
+
+    def set(self, symbols, version, stats):
+        with self.lock:
+            self.entries[symbols] = (version, stats)
+            self.entries.move_to_end(symbols)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, symbol):
+        """Drops every entry whose symbol set contains `symbol`."""
+        with self.lock:
+            for symbols in [symbols for symbols in self.entries if symbol in symbols]:
+                del self.entries[symbols]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+statistics_cache = StatisticsCache()
 
 class PortfolioOptimizer:
     def __init__(self, db_path, user_id, risk_free_rate=0.0531):
@@ -13,26 +100,27 @@ class PortfolioOptimizer:
         self.load_data(user_id)
     
     def load_data(self, user_id):
-        """Loads stock price data from the database for the specific user and prepares it for analysis."""
-        with sqlite3.connect(self.db_path) as conn:
+        """Loads the return statistics for the user's symbols, reusing cached ones when the data is unchanged."""
+        with get_connection(self.db_path, readonly=True) as conn:
             # First, retrieve only the symbols the user has in their assets
             user_symbols = pd.read_sql_query(
                 "SELECT DISTINCT symbol FROM user_assets WHERE user_id = ?",
                 conn,
                 params=(user_id,)
             )
-            symbols = user_symbols['symbol'].tolist()
-
-            # Now, load only the stock history for those symbols
-            query = "SELECT date, symbol, adjusted_close FROM stock_history WHERE symbol IN ({})"
-            query = query.format(','.join('?' for _ in symbols))  # Create placeholders
-            df = pd.read_sql_query(query, conn, params=symbols, parse_dates=['date'], index_col='date')
-
-        # Pivot the DataFrame to have dates as index and symbols as columns with their adjusted close prices
-        self.data = df.pivot(columns='symbol', values='adjusted_close')
-        self.returns = self.data.pct_change().dropna()
-        self.mean_returns = self.returns.mean()
-        self.cov_matrix = self.returns.cov()
+            symbols = tuple(sorted(user_symbols['symbol'].tolist()))
+            version = get_data_version(conn, symbols)
+
+            stats = statistics_cache.get(symbols, version)
+            if stats is None:
+                store = get_columnar_store()
+                if store is not None and symbols:
+                    stats = load_stored_return_statistics(store, symbols)
+                if stats is None:
+                    stats = load_return_statistics(conn, symbols)
+                statistics_cache.set(symbols, version, stats)
+
+        self.data, self.returns, self.mean_returns, self.cov_matrix = stats
     
     def portfolio_annualised_performance(self, weights):
         """Calculates the annualised performance of the portfolio based on the provided weights."""
@@ -40,26 +128,34 @@ class PortfolioOptimizer:
         std = np.sqrt(np.dot(weights.T, np.dot(self.cov_matrix, weights))) * np.sqrt(252)
         return std, returns
     
-    def random_portfolios(self, num_portfolios=5000):
-        """Generates random portfolios and calculates their performance metrics."""
-        num_assets = len(self.mean_returns)  # Number of assets based on mean_returns
-        portfolio_volatilities = []
-        portfolio_returns = []
-        sharpe_ratios = []
-        weights_record = []
-
-        for _ in range(num_portfolios):
-            weights = np.random.random(num_assets)
-            weights /= np.sum(weights)  # Normalize weights to sum to 1
-            
-            portfolio_std_dev, portfolio_return = self.portfolio_annualised_performance(weights)
-            portfolio_volatilities.append(portfolio_std_dev)
-            portfolio_returns.append(portfolio_return)
-            sharpe_ratio = (portfolio_return - self.risk_free_rate) / portfolio_std_dev
-            sharpe_ratios.append(sharpe_ratio)
-            weights_record.append(weights)
-
-        return portfolio_volatilities, portfolio_returns, sharpe_ratios, weights_record
+    def random_portfolios(self, num_portfolios=5000, chunk_size=10000, seed=None):
+        """Generates random portfolios in batches and calculates their performance metrics.
+
+        Weights are drawn as an (N, k) matrix and evaluated with matrix
+        operations, `chunk_size` rows at a time to bound memory. Returns
+        NumPy arrays of volatilities, returns, Sharpe ratios and weights.
+        """
+        mean_returns = self.mean_returns.to_numpy()
+        cov_matrix = self.cov_matrix.to_numpy()
+        num_assets = len(mean_returns)
+        if num_assets == 0:
+            num_portfolios = 0
+        rng = np.random.default_rng(seed)
+
+        weights = np.empty((num_portfolios, num_assets))
+        portfolio_returns = np.empty(num_portfolios)
+        portfolio_volatilities = np.empty(num_portfolios)
+        for start in range(0, num_portfolios, chunk_size):
+            rows = slice(start, start + chunk_size)
+            chunk = rng.random(weights[rows].shape)
+            chunk /= chunk.sum(axis=1, keepdims=True)  # Normalize weights to sum to 1
+            weights[rows] = chunk
+            portfolio_returns[rows] = chunk @ mean_returns * 252
+            variances = np.einsum('ij,ij->i', chunk @ cov_matrix, chunk)
+            portfolio_volatilities[rows] = np.sqrt(variances * 252)
+
+        sharpe_ratios = (portfolio_returns - self.risk_free_rate) / portfolio_volatilities
+        return portfolio_volatilities, portfolio_returns, sharpe_ratios, weights
 
     
     def optimize_portfolio(self, target_return=None, minimize_volatility=False):
@@ -79,6 +175,79 @@ class PortfolioOptimizer:
         result = sco.minimize(objective_function, num_assets*[1./num_assets], args=args, method='SLSQP', bounds=bounds, constraints=constraints)
         return result
     
+    def _annualised_moments(self):
+        return self.mean_returns.to_numpy() * 252, self.cov_matrix.to_numpy() * 252
+
+    def _solve(self, objective, x0, mean_returns=None, target_return=None):
+        """Run SLSQP over long-only, fully invested weights with analytic Jacobians."""
+        num_assets = len(x0)
+        constraints = [{'type': 'eq', 'fun': lambda x: np.sum(x) - 1, 'jac': lambda x: np.ones(num_assets)}]
+        if target_return is not None:
+            constraints.append({'type': 'eq', 'fun': lambda x: x @ mean_returns - target_return,
+                                'jac': lambda x: mean_returns})
+        return sco.minimize(objective, x0, jac=True, method='SLSQP',
+                            bounds=[(0, 1)] * num_assets, constraints=constraints)
+
+    def efficient_frontier(self, num_points=50):
+        """Traces the exact long-only efficient frontier by sweeping target returns.
+
+        Each target is a variance minimisation warm-started from the previous
+        solution. Targets where SLSQP does not converge are skipped. Returns a
+        dict with the frontier's returns, volatilities and weights, the max
+        Sharpe and min volatility portfolios, and a 'converged' summary.
+        """
+        mean_returns, cov_matrix = self._annualised_moments()
+        num_assets = len(mean_returns)
+        if num_assets == 0:
+            return None
+
+        def variance(x):
+            cov_x = cov_matrix @ x
+            return x @ cov_x, 2 * cov_x
+
+        def negative_sharpe(x):
+            cov_x = cov_matrix @ x
+            std = np.sqrt(x @ cov_x)
+            excess = x @ mean_returns - self.risk_free_rate
+            return -excess / std, -(mean_returns * std - excess * cov_x / std) / std ** 2
+
+        min_vol_result = self._solve(variance, np.full(num_assets, 1. / num_assets))
+        min_vol = min_vol_result.x
+        low, high = min_vol @ mean_returns, mean_returns.max()
+        targets = np.linspace(low, high, num_points) if high - low > 1e-12 else np.array([low])
+
+        # Targets whose optimization did not converge are left off the frontier
+        weights = []
+        x = min_vol
+        for target in targets:
+            result = self._solve(variance, x, mean_returns, target)
+            if result.success:
+                x = result.x
+                weights.append(x)
+        weights = np.array(weights).reshape(-1, num_assets)
+        returns = weights @ mean_returns
+        volatilities = np.sqrt(np.einsum('ij,ij->i', weights @ cov_matrix, weights))
+
+        # Start the tangency search from the best point already on the frontier
+        x0 = weights[np.argmax((returns - self.risk_free_rate) / volatilities)] if len(weights) else min_vol
+        max_sharpe_result = self._solve(negative_sharpe, x0)
+        # Fall back to the starting point rather than report an unconverged portfolio
+        max_sharpe = max_sharpe_result.x if max_sharpe_result.success else x0
+
+        return {
+            'returns': returns,
+            'volatilities': volatilities,
+            'weights': weights,
+            'max_sharpe_weights': max_sharpe,
+            'min_vol_weights': min_vol,
+            'converged': {
+                'min_vol': bool(min_vol_result.success),
+                'max_sharpe': bool(max_sharpe_result.success),
+                'frontier_points': len(weights),
+                'skipped_points': len(targets) - len(weights),
+            },
+        }
+
     def portfolio_volatility(self, weights):
         """Calculates the portfolio volatility for given weights."""
         return self.portfolio_annualised_performance(weights)[0]
@@ -89,13 +258,13 @@ class PortfolioOptimizer:
             "Volatility": portfolio_volatilities,
             "Return": portfolio_returns,
             "Sharpe Ratio": sharpe_ratios,
-            "Weights": [json.dumps(weights.tolist()) for weights in weights_list]
+            "Weights": list(np.asarray(weights_list))
         }
         return pd.DataFrame(data)
 
     def calculate_portfolio_weights(self, user_id):
         """Calculate portfolio weights based on the current holdings and latest stock prices for a specific user."""
-        with sqlite3.connect(self.db_path) as conn:
+        with get_connection(self.db_path, readonly=True) as conn:
             latest_prices = pd.read_sql_query(
     """
     SELECT sh.symbol, sh.adjusted_close
@@ -129,7 +298,7 @@ class PortfolioOptimizer:
     
     def get_user_symbols(self, user_id):
         """Retrieve and return a list of stock symbols from the user_assets table for a specific user."""
-        with sqlite3.connect(self.db_path) as conn:
+        with get_connection(self.db_path, readonly=True) as conn:
             cursor = conn.cursor()
             cursor.execute(
                 "SELECT DISTINCT symbol FROM user_assets WHERE user_id = ?",
@@ -0,0 +1,95 @@
+import base64
+import json
+from datetime import date, timedelta
+
+# Rows per page of transaction history
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(row):
+    """Opaque cursor pointing just past `row` in (timestamp, id) order."""
+    raw = json.dumps([row['timestamp'], row['id']]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the (timestamp, id) a cursor points past, or None for the first page.
+
+    Raises ValueError for a cursor that was not produced by encode_cursor.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        timestamp, row_id = json.loads(raw)
+        return str(timestamp), int(row_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Invalid cursor.') from e
+
+
+def parse_page_size(value, default=PAGE_SIZE):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def day_range(start_date, end_date=None):
+    """Turn an inclusive 'YYYY-MM-DD' date range into a half-open timestamp range.
+
+    Comparing the raw timestamp keeps the search on the (timestamp, id)
+    index, which DATE(timestamp) = ? cannot use. Raises ValueError for a
+    malformed date.
+    """
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date) if end_date else start
+    return start.isoformat(), (end + timedelta(days=1)).isoformat()
+
+
+def fetch_transactions_page(db, user_id=None, since=None, until=None, cursor=None,
+                            limit=PAGE_SIZE, with_usernames=False):
+    """One page of transactions, newest first, after `cursor`.
+
+    Each page is an index range scan that stops after `limit` rows, so its
+    cost does not grow with the ledger. Returns (rows, next cursor or None).
+    """
+    columns = 't.id, t.user_id, t.symbol, t.type, t.quantity, t.price, t.timestamp'
+    joins = ''
+    if with_usernames:
+        columns += ', u.username'
+        joins = 'JOIN user_info u ON t.user_id = u.id'
+
+    conditions, params = [], []
+    if user_id is not None:
+        conditions.append('t.user_id = ?')
+        params.append(user_id)
+    if since is not None:
+        conditions.append('t.timestamp >= ?')
+        params.append(since)
+    if until is not None:
+        conditions.append('t.timestamp < ?')
+        params.append(until)
+    position = decode_cursor(cursor)
+    if position is not None:
+        conditions.append('(t.timestamp, t.id) < (?, ?)')
+        params.extend(position)
+
+    where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+    rows = db.execute(f'''
+    SELECT {columns}
+    FROM transactions_history t
+    {joins}
+    {where}
+    ORDER BY t.timestamp DESC, t.id DESC
+    LIMIT ?
+    ''', (*params, limit + 1)).fetchall()
+
+    # The extra row only tells whether another page exists
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def transaction_to_dict(row):
+    return {key: row[key] for key in row.keys()}
@@ -0,0 +1,163 @@
+import itertools
+
+import click
+import numpy as np
+import pandas as pd
+from flask import current_app
+from flask.cli import with_appcontext
+
+from .db import get_connection
+
+MOVING_AVERAGE_WINDOWS = (10, 50, 200)
+RSI_PERIOD = 14
+VOLATILITY_WINDOW = 30
+# Bars before the first new one that the rolling windows need
+LOOKBACK = max(MOVING_AVERAGE_WINDOWS + (VOLATILITY_WINDOW + 1,))
+
+INDICATOR_COLUMNS = ['ma10', 'ma50', 'ma200', 'rsi14', 'avg_gain14', 'avg_loss14', 'volatility30']
+PRICE_TABLES = ('stock_history', 'index_data')
+
+
+def wilder_average(values, period, seed=None):
+    """Wilder's smoothing: avg = (previous avg * (period - 1) + value) / period.
+
+    Without `seed` the first average is the plain mean of the first
+    `period` values; with it (the average before values[0]) the recursion
+    just continues, which is what makes appending a bar O(1).
+    """
+    averages = np.full(len(values), np.nan)
+    if seed is None:
+        if len(values) < period:
+            return averages
+        average = values[:period].mean()
+        averages[period - 1] = average
+        start = period
+    else:
+        average = seed
+        start = 0
+    for i in range(start, len(values)):
+        average = (average * (period - 1) + values[i]) / period
+        averages[i] = average
+    return averages
+
+
+def rsi_from_averages(avg_gain, avg_loss):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(avg_loss == 0, 100.0, 100 - 100 / (1 + avg_gain / avg_loss))
+
+
+def wilder_rsi(closes, period=RSI_PERIOD):
+    """Wilder's RSI over a whole series of closes; NaN until `period` changes exist."""
+    changes = np.diff(closes)
+    avg_gain = np.concatenate(([np.nan], wilder_average(np.clip(changes, 0, None), period)))
+    avg_loss = np.concatenate(([np.nan], wilder_average(np.clip(-changes, 0, None), period)))
+    return rsi_from_averages(avg_gain, avg_loss)
+
+
+def compute_indicators(closes, new_count, rsi_state=None):
+    """Indicator columns for the last `new_count` closes.
+
+    Earlier closes only feed the windows. `rsi_state` is the (avg_gain,
+    avg_loss) of the bar before the new ones; without it `closes` must be
+    the symbol's whole history. Returns a dict of arrays of length new_count.
+    """
+    series = pd.Series(closes)
+    values = {f'ma{window}': series.rolling(window).mean().to_numpy() for window in MOVING_AVERAGE_WINDOWS}
+    values['volatility30'] = (series.pct_change().rolling(VOLATILITY_WINDOW).std() * np.sqrt(252)).to_numpy()
+
+    # changes[i] is the move into bar i + 1
+    changes = np.diff(closes)
+    gains, losses = np.clip(changes, 0, None), np.clip(-changes, 0, None)
+    if rsi_state is None:
+        avg_gain = np.concatenate(([np.nan], wilder_average(gains, RSI_PERIOD)))
+        avg_loss = np.concatenate(([np.nan], wilder_average(losses, RSI_PERIOD)))
+    else:
+        avg_gain = wilder_average(gains[-new_count:], RSI_PERIOD, rsi_state[0])
+        avg_loss = wilder_average(losses[-new_count:], RSI_PERIOD, rsi_state[1])
+    values.update(rsi14=rsi_from_averages(avg_gain, avg_loss), avg_gain14=avg_gain, avg_loss14=avg_loss)
+    return {name: np.asarray(column)[-new_count:] for name, column in values.items()}
+
+
+def update_indicators(conn, table_name, symbol, since=None):
+    """Store indicators for a symbol's bars dated `since` onward.
+
+    Only the last LOOKBACK bars before `since` and the stored RSI state
+    are read, so appending bars costs O(new bars). Without `since`, or
+    when the stored state does not line up with the bars, the symbol is
+    recomputed from scratch. Runs inside the caller's transaction and
+    returns the number of rows written.
+    """
+    if table_name not in PRICE_TABLES:
+        raise ValueError(f'Unknown price table: {table_name}')
+    prior, rsi_state = [], None
+    if since is not None:
+        prior = conn.execute(f'''
+        SELECT date, close FROM {table_name}
+        WHERE symbol = ? AND date < ? AND close IS NOT NULL
+        ORDER BY date DESC LIMIT ?
+        ''', (symbol, since, LOOKBACK)).fetchall()[::-1]
+        state = conn.execute('''
+        SELECT date, avg_gain14, avg_loss14 FROM indicators
+        WHERE table_name = ? AND symbol = ? AND date < ?
+        ORDER BY date DESC LIMIT 1
+        ''', (table_name, symbol, since)).fetchone()
+        if prior and state is not None and state[0] == prior[-1][0] and None not in state[1:]:
+            rsi_state = state[1:]
+        else:
+            since = None
+    if since is None:
+        prior = []
+        conn.execute('DELETE FROM indicators WHERE table_name = ? AND symbol = ?', (table_name, symbol))
+
+    new = conn.execute(f'''
+    SELECT date, close FROM {table_name}
+    WHERE symbol = ? AND date >= ? AND close IS NOT NULL
+    ORDER BY date
+    ''', (symbol, since or '')).fetchall()
+    if not new:
+        return 0
+
+    closes = np.array([close for _, close in prior + new], dtype=float)
+    values = compute_indicators(closes, len(new), rsi_state)
+    conn.executemany(f'''
+    INSERT INTO indicators (table_name, symbol, date, {", ".join(INDICATOR_COLUMNS)})
+    VALUES (?, ?, ?, {", ".join("?" for _ in INDICATOR_COLUMNS)})
+    ON CONFLICT(table_name, symbol, date) DO UPDATE SET
+        {", ".join(f"{name}=excluded.{name}" for name in INDICATOR_COLUMNS)}
+    ''', zip(
+        itertools.repeat(table_name),
+        itertools.repeat(symbol),
+        [date for date, _ in new],
+        # NaN is stored as NULL
+        *(np.where(np.isnan(values[name]), None, values[name]).tolist() for name in INDICATOR_COLUMNS)
+    ))
+    return len(new)
+
+
+def load_indicators(conn, table_name, symbol):
+    """A symbol's stored indicators, oldest first, with parsed dates."""
+    return pd.read_sql_query(
+        f'SELECT date, {", ".join(INDICATOR_COLUMNS)} FROM indicators '
+        'WHERE table_name = ? AND symbol = ? ORDER BY date',
+        conn, params=(table_name, symbol), parse_dates=['date'])
+
+
+def indicators_from_series(df):
+    """Indicators computed on the fly from a date/close frame, for symbols not in the table yet."""
+    df = df[df['close'].notna()]
+    values = compute_indicators(df['close'].to_numpy(dtype=float), len(df)) if len(df) else {
+        name: np.array([]) for name in INDICATOR_COLUMNS}
+    return pd.DataFrame({'date': df['date'].to_numpy(), **values})
+
+
+@click.command('rebuild-indicators')
+@click.option('--symbol', 'symbols', multiple=True, help='Rebuild only these symbols (repeatable).')
+@with_appcontext
+def rebuild_indicators_command(symbols):
+    """Recompute the stored technical indicators from the price tables."""
+    with get_connection(current_app.config['DATABASE']) as conn:
+        for table_name in PRICE_TABLES:
+            names = symbols or [row[0] for row in conn.execute(f'SELECT DISTINCT symbol FROM {table_name}')]
+            rows = sum(update_indicators(conn, table_name, symbol) for symbol in names)
+            click.echo(f'{table_name}: {rows} indicator rows for {len(names)} symbols.')
+        conn.commit()
@@ -1,13 +1,12 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, g, session, current_app, jsonify, json
 from .auth import login_required
 from .db import get_db
-from .retrieve_data import Alpha_Vantage_Data
+from .retrieve_data import Alpha_Vantage_Data, fetch_latest_prices
 from datetime import datetime
-from .plot import plot_returns, plot_comparison_with_index, plot_regression_between_stock_and_index, plot_cumulative_return_comparison, calculate_volatility,calculate_and_plot_rsi, plot_moving_averages
-from plotly.utils import PlotlyJSONEncoder
-from .store_history import calculate_and_update_cumulative_return, clean_old_data, fetch_and_process_data, update_spy_index_data
-import plotly.io as pio
-import json
+from .history import fetch_transactions_page
+from .aggregates import record_daily_trade, update_symbol_holding
+from .plot import CHARTS
+from .scheduler import backfill_missing, record_symbol_view, queue_backfill
 
 bp = Blueprint('main', __name__)
 
@@ -36,133 +35,135 @@ def transaction():
         (user_id,)
     ).fetchall()
 
-    transactions = db.execute(
-        'SELECT * FROM transactions_history WHERE user_id = ? ORDER BY timestamp DESC',
-        (user_id,)
-    ).fetchall()
+    # One page of history at a time; older pages follow the cursor
+    try:
+        transactions, next_cursor = fetch_transactions_page(db, user_id=user_id, cursor=request.args.get('cursor'))
+    except ValueError:
+        flash('Invalid page link, showing the latest transactions.', 'error')
+        transactions, next_cursor = fetch_transactions_page(db, user_id=user_id)
 
     return render_template(
         'transaction.html', 
         user_info=user_info, 
         user_assets=user_assets,
         transactions=transactions,
+        next_cursor=next_cursor,
         page_data={"title": "Trading Platform"}
     )
 
-# Function to buy stock
-@bp.route('/transaction/buy', methods=['POST'])
-@login_required
-def buy_stock():
-    user_id = session.get('user_id')
-    symbol = request.form.get('symbol')
-    quantity = int(request.form.get('quantity'))
-
-    if quantity <= 0:
-        flash('Invalid quantity.', 'error')
-        return redirect(url_for('main.transaction'))
-
-    av_data = Alpha_Vantage_Data(symbol)
-    current_price, _ = av_data.get_daily_stock_price_show()
-
-    if current_price is None:
-        flash('Unable to retrieve current price.', 'error')
-        return redirect(url_for('main.transaction'))
-
-    db = get_db()
-    try:
-        db.execute('BEGIN TRANSACTION')
+def execute_buy(db, user_id, symbol, quantity, price):
+    """Apply a buy inside the caller's transaction with a fixed number of writes.
 
-        user = db.execute('SELECT * FROM user_info WHERE id = ?', (user_id,)).fetchone()
+    Returns an error message, or None on success.
+    """
+    total_cost = float(price) * quantity
+    updated = db.execute(
+        'UPDATE user_info SET balance = balance - ? WHERE id = ? AND balance >= ?',
+        (total_cost, user_id, total_cost)
+    )
+    if updated.rowcount == 0:
+        return 'Insufficient balance to complete the transaction.'
+
+    held = db.execute(
+        'INSERT INTO user_assets (user_id, symbol, quantity) VALUES (?, ?, ?) '
+        'ON CONFLICT(user_id, symbol) DO UPDATE SET quantity = quantity + excluded.quantity '
+        'RETURNING quantity',
+        (user_id, symbol, quantity)
+    ).fetchone()[0]
+    # A new holder if the position is exactly this order
+    update_symbol_holding(db, symbol, quantity, 1 if held == quantity else 0)
+    record_transaction(db, user_id, symbol, 'BUY', quantity, price)
+    return None
+
+
+def execute_sell(db, user_id, symbol, quantity, price):
+    """Apply a sell inside the caller's transaction with a fixed number of writes.
+
+    Returns an error message, or None on success.
+    """
+    updated = db.execute(
+        'UPDATE user_assets SET quantity = quantity - ? WHERE user_id = ? AND symbol = ? AND quantity >= ?',
+        (quantity, user_id, symbol, quantity)
+    )
+    if updated.rowcount == 0:
+        return 'Not enough stock to sell.'
 
-        total_cost = float(current_price) * quantity
-        if user['balance'] < total_cost:
-            flash('Insufficient balance to complete the transaction.', 'error')
-            return redirect(url_for('main.transaction'))
+    closed = db.execute('DELETE FROM user_assets WHERE user_id = ? AND symbol = ? AND quantity = 0', (user_id, symbol))
+    update_symbol_holding(db, symbol, -quantity, -closed.rowcount)
+    db.execute('UPDATE user_info SET balance = balance + ? WHERE id = ?', (quantity * float(price), user_id))
+    record_transaction(db, user_id, symbol, 'SELL', quantity, price)
+    return None
 
-        new_balance = user['balance'] - total_cost
-        db.execute('UPDATE user_info SET balance = ? WHERE id = ?', (new_balance, user_id))
 
-        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        db.execute('INSERT INTO transactions_history (user_id, symbol, type, quantity, price, timestamp) VALUES (?, ?, ?, ?, ?, ?)',
-                   (user_id, symbol, 'BUY', quantity, current_price, current_time))
+def record_transaction(db, user_id, symbol, type, quantity, price):
+    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    db.execute('INSERT INTO transactions_history (user_id, symbol, type, quantity, price, timestamp) VALUES (?, ?, ?, ?, ?, ?)',
+               (user_id, symbol, type, quantity, price, current_time))
+    record_daily_trade(db, symbol, type, quantity, price, current_time)
 
-        asset = db.execute('SELECT * FROM user_assets WHERE user_id = ? AND symbol = ?', (user_id, symbol)).fetchone()
-        if asset:
-            new_quantity = asset['quantity'] + quantity
-            db.execute('UPDATE user_assets SET quantity = ? WHERE id = ?', (new_quantity, asset['id']))
-        else:
-            db.execute('INSERT INTO user_assets (user_id, symbol, quantity) VALUES (?, ?, ?)', (user_id, symbol, quantity))
 
-        time_series_daily = av_data.get_daily_stock_price()
-        for date, adjusted_close in time_series_daily.items():
-            formatted_date = datetime.strptime(date, '%Y-%m-%d').strftime('%Y-%m-%d')
-            adjusted_close = format(float(adjusted_close), '.2f')
-            db.execute('INSERT OR IGNORE INTO stock_history (symbol, date, adjusted_close) VALUES (?, ?, ?)', (symbol, formatted_date, adjusted_close))
+def parse_quantity(value):
+    """A positive whole number of shares from form or JSON input, or None.
 
-        db.commit()
-        flash('Stock purchased successfully!', 'success')
-    except Exception as e:
-        db.rollback()
-        flash(f'Error processing transaction: {e}', 'error')
-    return redirect(url_for('main.transaction'))
+    Fractional values such as 2.7 are rejected rather than truncated.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    elif isinstance(value, str) and value.strip().isdecimal():
+        value = int(value)
+    return value if isinstance(value, int) and value > 0 else None
 
 
-# Function to sell stock
-@bp.route('/transaction/sell', methods=['POST'])
-@login_required
-def sell_stock():
+def run_trade(execute, success_message):
+    """Price and execute the order posted in the form, then redirect to the trading platform."""
     user_id = session.get('user_id')
     symbol = request.form.get('symbol')
-    quantity = int(request.form.get('quantity'))
+    quantity = parse_quantity(request.form.get('quantity'))
 
-    if quantity <= 0:
-        flash('Invalid quantity to sell.', 'error')
+    if quantity is None:
+        flash('Invalid quantity.', 'error')
         return redirect(url_for('main.transaction'))
-    
-    av_data = Alpha_Vantage_Data(symbol)
-    current_price, _ = av_data.get_daily_stock_price_show()
+
+    current_price, _ = Alpha_Vantage_Data(symbol).get_daily_stock_price_show()
     if current_price is None:
         flash('Unable to retrieve current price.', 'error')
         return redirect(url_for('main.transaction'))
 
-    current_price = format(float(current_price), '.2f')
-    time_series_daily = av_data.get_daily_stock_price()
-
     db = get_db()
     try:
-        db.execute('BEGIN TRANSACTION')
-
-        asset = db.execute('SELECT * FROM user_assets WHERE user_id = ? AND symbol = ?', (user_id, symbol)).fetchone()
-        if not asset or asset['quantity'] < quantity:
-            flash('Not enough stock to sell.', 'error')
+        # Take the write lock up front; the transaction is a handful of statements
+        db.execute('BEGIN IMMEDIATE')
+        error = execute(db, user_id, symbol, quantity, current_price)
+        if error:
+            db.rollback()
+            flash(error, 'error')
             return redirect(url_for('main.transaction'))
-
-        new_quantity = asset['quantity'] - quantity
-        if new_quantity > 0:
-            db.execute('UPDATE user_assets SET quantity = ? WHERE id = ?', (new_quantity, asset['id']))
-        else:
-            db.execute('DELETE FROM user_assets WHERE id = ?', (asset['id'],))
-
-        user = db.execute('SELECT * FROM user_info WHERE id = ?', (user_id,)).fetchone()
-        updated_balance = user['balance'] + quantity * float(current_price)
-        db.execute('UPDATE user_info SET balance = ? WHERE id = ?', (updated_balance, user_id))
-
-        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        db.execute('INSERT INTO transactions_history (user_id, symbol, type, quantity, price, timestamp) VALUES (?, ?, ?, ?, ?, ?)',
-                   (user_id, symbol, 'SELL', quantity, current_price, current_time))
-
-        for date, adjusted_close in time_series_daily.items():
-            formatted_date = datetime.strptime(date, '%Y-%m-%d').strftime('%Y-%m-%d')
-            adjusted_close = format(float(adjusted_close), '.2f')
-            db.execute('INSERT OR IGNORE INTO stock_history (symbol, date, adjusted_close) VALUES (?, ?, ?)', (symbol, formatted_date, adjusted_close))
         db.commit()
-        flash('Stock sold successfully!', 'success')
+        flash(success_message, 'success')
     except Exception as e:
         db.rollback()
         flash(f'Error processing transaction: {e}', 'error')
+        return redirect(url_for('main.transaction'))
+
+    # Missing or stale bars of the traded symbol are backfilled off the trade path
+    queue_backfill(current_app._get_current_object(), [symbol])
     return redirect(url_for('main.transaction'))
 
 
+# Function to buy stock
+@bp.route('/transaction/buy', methods=['POST'])
+@login_required
+def buy_stock():
+    return run_trade(execute_buy, 'Stock purchased successfully!')
+
+
+# Function to sell stock
+@bp.route('/transaction/sell', methods=['POST'])
+@login_required
+def sell_stock():
+    return run_trade(execute_sell, 'Stock sold successfully!')
 
 
 @bp.route('/profile/conduct_transaction', methods=['POST'])
@@ -179,6 +180,95 @@ def conduct_transaction():
         return redirect(url_for('main.transaction'))
 
 
+TRADE_EXECUTORS = {'buy': execute_buy, 'sell': execute_sell}
+MAX_BATCH_ORDERS = 50
+
+
+def parse_batch_orders():
+    """Read orders from a JSON body ({"orders": [{"symbol", "action", "quantity"}]})
+    or from repeated symbol/action/quantity form fields.
+
+    Returns (orders, error message).
+    """
+    if request.is_json:
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            return None, 'Expected a JSON object with an "orders" list.'
+        raw = body.get('orders') or []
+        if not isinstance(raw, list) or not all(isinstance(order, dict) for order in raw):
+            return None, '"orders" must be a list of objects.'
+    else:
+        raw = [{'symbol': symbol, 'action': action, 'quantity': quantity} for symbol, action, quantity in zip(
+            request.form.getlist('symbol'), request.form.getlist('action'), request.form.getlist('quantity'))]
+
+    if not raw:
+        return None, 'No orders submitted.'
+    if len(raw) > MAX_BATCH_ORDERS:
+        return None, f'At most {MAX_BATCH_ORDERS} orders can be submitted at once.'
+
+    orders = []
+    for order in raw:
+        symbol = str(order.get('symbol') or '').strip()
+        action = str(order.get('action') or '').lower()
+        quantity = parse_quantity(order.get('quantity'))
+        if not symbol or action not in TRADE_EXECUTORS:
+            return None, 'Invalid action.'
+        if quantity is None:
+            return None, f'Invalid quantity for {symbol}.'
+        orders.append((symbol, action, quantity))
+    return orders, None
+
+
+def execute_batch(db, user_id, orders, prices):
+    """Apply every order inside the caller's transaction, sells first so
+    their proceeds can fund the buys.
+
+    Returns an error message naming the first order that cannot be filled,
+    or None when the whole batch went through.
+    """
+    for symbol, action, quantity in sorted(orders, key=lambda order: order[1] != 'sell'):
+        error = TRADE_EXECUTORS[action](db, user_id, symbol, quantity, prices[symbol])
+        if error:
+            return f'{action.capitalize()} {quantity} {symbol}: {error}'
+    return None
+
+
+# Submit several buy and sell orders as one all-or-nothing transaction
+@bp.route('/transaction/batch', methods=['POST'])
+@login_required
+def batch_transaction():
+    def respond(message, category, status=200):
+        if request.is_json:
+            return jsonify({'status': category, 'message': message}), status
+        flash(message, category)
+        return redirect(url_for('main.transaction'))
+
+    user_id = session.get('user_id')
+    orders, error = parse_batch_orders()
+    if error:
+        return respond(error, 'error', 400)
+
+    # One price lookup per distinct symbol, all in parallel
+    prices = fetch_latest_prices(symbol for symbol, _, _ in orders)
+    missing = [symbol for symbol, price in prices.items() if price is None]
+    if missing:
+        return respond(f'Unable to retrieve current price for {", ".join(missing)}.', 'error', 502)
+
+    db = get_db()
+    try:
+        db.execute('BEGIN IMMEDIATE')
+        error = execute_batch(db, user_id, orders, prices)
+        if error:
+            db.rollback()
+            return respond(error, 'error', 409)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        return respond(f'Error processing transaction: {e}', 'error', 500)
+
+    queue_backfill(current_app._get_current_object(), list(prices))
+    return respond(f'{len(orders)} orders executed successfully!', 'success')
+
 
 # Create contact us form
 @bp.route('/contact_us')
@@ -202,57 +292,28 @@ def submit_contact_form():
     return redirect(url_for('main.contact_us'))
 
 
+def has_price_history(db, symbol):
+    stock = db.execute('SELECT 1 FROM stock_history WHERE symbol = ? AND close IS NOT NULL LIMIT 1', (symbol,)).fetchone()
+    index = db.execute("SELECT 1 FROM index_data WHERE symbol = 'SPY' LIMIT 1").fetchone()
+    return stock is not None and index is not None
+
 @bp.route('/plot/<symbol>')
 def plot_view(symbol):
     db_path = current_app.config['DATABASE']
     response = None
     try:
-        # Clean Old data
-        clean_old_data(db_path, 'stock_history')
-        clean_old_data(db_path, 'index_data')
-        # Fetch new data and then process
-        fetch_and_process_data(symbol, db_path)
-        update_spy_index_data(db_path)
-        # Update the cumulative returns
-        calculate_and_update_cumulative_return(db_path, 'stock_history')
-        calculate_and_update_cumulative_return(db_path, 'index_data')
-
-        # Generate new plots
-        plot_data = plot_returns(db_path, symbol)
-        comparison_plot_data = plot_comparison_with_index(db_path, symbol)
-        regression_plot_data = plot_regression_between_stock_and_index(db_path, symbol)
-        cumulative_comparison_data = plot_cumulative_return_comparison(db_path, symbol)
-        volatility_data = calculate_volatility(db_path, symbol)
-        rsi_data = calculate_and_plot_rsi(db_path,symbol)
-        moving_average_data = plot_moving_averages(db_path, symbol)
-
-        scatter_data_json = json.dumps(plot_data['scatter_data'], cls=PlotlyJSONEncoder)
-        returns_data_json = json.dumps(plot_data['returns_data'], cls=PlotlyJSONEncoder)
-        cumulative_data_json = json.dumps(plot_data['cumulative_data'], cls=PlotlyJSONEncoder)
-        price_data_json = json.dumps(plot_data['price_data'], cls=PlotlyJSONEncoder)
-        simple_vs_yesterday_data_json = json.dumps(plot_data['simple_vs_yesterday_data'], cls=PlotlyJSONEncoder)
-        histogram_data_json = json.dumps(plot_data['histogram_data'], cls=PlotlyJSONEncoder)
-        comparison_data_json = json.dumps(comparison_plot_data, cls=PlotlyJSONEncoder)  # 新图表数据
-        regression_data_json = json.dumps(regression_plot_data, cls=PlotlyJSONEncoder)  # 新回归线散点图数据
-        cumulative_comparison_data_json = json.dumps(cumulative_comparison_data, cls=PlotlyJSONEncoder)  # 新累计回报率对比图数据
-        volatility_data_json = json.dumps(volatility_data, cls=PlotlyJSONEncoder)
-        rsi_data_json = json.dumps(rsi_data, cls=PlotlyJSONEncoder)
-        moving_average_data_json = json.dumps(moving_average_data, cls=PlotlyJSONEncoder)
-        
-        response = render_template('plot.html', 
-                                   returns_data_json=returns_data_json, 
-                                   scatter_data_json=scatter_data_json, 
-                                   cumulative_data_json=cumulative_data_json, 
-                                   price_data_json=price_data_json, 
-                                   simple_vs_yesterday_data_json=simple_vs_yesterday_data_json, 
-                                   histogram_data_json=histogram_data_json, 
-                                   comparison_data_json=comparison_data_json,
-                                   regression_data_json=regression_data_json,
-                                   cumulative_comparison_data_json = cumulative_comparison_data_json,
-                                   volatility_data_json = volatility_data_json,
-                                   rsi_data_json = rsi_data_json,
-                                   moving_average_data_json = moving_average_data_json,
-                                   symbol=symbol)
+        # Bars are kept fresh by the refresh scheduler; only a symbol seen
+        # for the first time is downloaded on the request thread
+        db = get_db()
+        if not has_price_history(db, symbol):
+            backfill_missing(db_path, symbol)
+            if not has_price_history(db, symbol):
+                return render_template('error.html', message=f'No price history is available for {symbol}.')
+        # Only symbols that really have bars join the watch set
+        record_symbol_view(db, symbol)
+
+        # The page is a skeleton; each chart is fetched from /api/plot/<symbol>/<chart>
+        response = render_template('plot.html', symbol=symbol, charts=list(CHARTS))
     except Exception as e:
         response = render_template('error.html', message=str(e))
     return response
@@ -0,0 +1,77 @@
+import os
+import re
+
+import click
+from flask.cli import with_appcontext
+
+from .db import get_connection, get_db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), 'migrations')
+MIGRATION_FILE = re.compile(r'^(\d{4})_(\w+)\.sql$')
+
+
+def list_migrations():
+    """Return (version, name, path) for every migration script, oldest first."""
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    return sorted(migrations)
+
+
+def get_schema_version(db):
+    return db.execute('PRAGMA user_version').fetchone()[0]
+
+
+def apply_migrations(db, target=None):
+    """Apply pending migrations in order, each in its own transaction.
+
+    The schema version is kept in PRAGMA user_version. Returns the
+    (version, name) pairs that were applied.
+    """
+    current = get_schema_version(db)
+    applied = []
+    for version, name, path in list_migrations():
+        if version <= current or (target is not None and version > target):
+            continue
+        with open(path, encoding='utf8') as f:
+            script = f.read()
+        db.executescript(f'BEGIN;\n{script}\nPRAGMA user_version = {version};\nCOMMIT;')
+        applied.append((version, name))
+    return applied
+
+
+def check_schema_version(db_path):
+    """Warn at startup when the database is missing or behind the latest migration.
+
+    Returns the warning printed, or None when the schema is current.
+    """
+    latest = max((version for version, _, _ in list_migrations()), default=0)
+    if not os.path.exists(db_path):
+        warning = f'Database {db_path} does not exist; run "flask --app flaskr init-db".'
+    else:
+        current = get_schema_version(get_connection(db_path, readonly=True))
+        if current >= latest:
+            return None
+        warning = (f'Database schema version {current} is behind the latest migration {latest}; '
+                   f'run "flask --app flaskr migrate" before serving requests.')
+    print(warning)
+    return warning
+
+
+@click.command('migrate')
+@click.option('--target', type=int, default=None, help='Stop after this schema version.')
+@click.option('--status', is_flag=True, help='Only show the current and latest schema versions.')
+@with_appcontext
+def migrate_command(target, status):
+    """Upgrade the existing database schema without losing data."""
+    db = get_db()
+    latest = max((version for version, _, _ in list_migrations()), default=0)
+    if status:
+        click.echo(f'Schema version {get_schema_version(db)} (latest {latest}).')
+        return
+    applied = apply_migrations(db, target)
+    for version, name in applied:
+        click.echo(f'Applied migration {version:04d} {name}.')
+    click.echo(f'Database is at schema version {get_schema_version(db)}.')
@@ -0,0 +1,13 @@
+-- Bookkeeping tables used by incremental ingestion and the refresh scheduler
+CREATE TABLE IF NOT EXISTS ingestion_state (
+    table_name TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    last_date DATE NOT NULL,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (table_name, symbol)
+);
+
+CREATE TABLE IF NOT EXISTS symbol_views (
+    symbol TEXT PRIMARY KEY,
+    viewed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,17 @@
+-- Transaction history of one user, newest first
+CREATE INDEX IF NOT EXISTS idx_transactions_user_time
+    ON transactions_history (user_id, timestamp, id);
+
+-- Admin "transactions on a given day" filter; the second column serves the ORDER BY
+CREATE INDEX IF NOT EXISTS idx_transactions_day
+    ON transactions_history (DATE(timestamp), timestamp);
+
+-- Holding lookups by user and by (user, symbol)
+CREATE INDEX IF NOT EXISTS idx_user_assets_user_symbol
+    ON user_assets (user_id, symbol, quantity);
+
+-- Latest price per symbol answered from the index alone
+CREATE INDEX IF NOT EXISTS idx_stock_history_symbol_date_close
+    ON stock_history (symbol, date, adjusted_close);
+
+ANALYZE;
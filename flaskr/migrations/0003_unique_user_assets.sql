@@ -0,0 +1,17 @@
+-- One row per (user_id, symbol) so trades can upsert holdings.
+-- Merge any duplicate rows into the oldest one first.
+UPDATE user_assets
+SET quantity = (
+    SELECT SUM(a.quantity) FROM user_assets a
+    WHERE a.user_id IS user_assets.user_id AND a.symbol = user_assets.symbol
+)
+WHERE id IN (
+    SELECT MIN(id) FROM user_assets GROUP BY user_id, symbol HAVING COUNT(*) > 1
+);
+
+DELETE FROM user_assets
+WHERE id NOT IN (SELECT MIN(id) FROM user_assets GROUP BY user_id, symbol);
+
+DROP INDEX IF EXISTS idx_user_assets_user_symbol;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_user_assets_user_symbol
+    ON user_assets (user_id, symbol);
@@ -0,0 +1,9 @@
+-- Keyset pagination over the whole ledger, newest first, and the admin
+-- date-range search (timestamp >= ? AND timestamp < ?)
+CREATE INDEX IF NOT EXISTS idx_transactions_time
+    ON transactions_history (timestamp, id);
+
+-- Replaced by range scans on idx_transactions_time
+DROP INDEX IF EXISTS idx_transactions_day;
+
+ANALYZE;
@@ -0,0 +1,36 @@
+-- Pre-aggregated totals for the admin dashboard, kept current by every
+-- trade; per-user positions are user_assets itself (one row per user and
+-- symbol since 0003). 'flask rebuild-aggregates' recomputes both tables.
+CREATE TABLE IF NOT EXISTS symbol_holdings (
+    symbol TEXT PRIMARY KEY,
+    total_quantity INTEGER NOT NULL DEFAULT 0,
+    holders INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS daily_trade_volume (
+    symbol TEXT NOT NULL,
+    day DATE NOT NULL,
+    buy_quantity INTEGER NOT NULL DEFAULT 0,
+    sell_quantity INTEGER NOT NULL DEFAULT 0,
+    buy_value REAL NOT NULL DEFAULT 0,
+    sell_value REAL NOT NULL DEFAULT 0,
+    trade_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (symbol, day)
+);
+
+-- Volume trends across all symbols
+CREATE INDEX IF NOT EXISTS idx_daily_trade_volume_day
+    ON daily_trade_volume (day);
+
+INSERT INTO symbol_holdings (symbol, total_quantity, holders)
+SELECT symbol, SUM(quantity), COUNT(*) FROM user_assets GROUP BY symbol;
+
+INSERT INTO daily_trade_volume (symbol, day, buy_quantity, sell_quantity, buy_value, sell_value, trade_count)
+SELECT symbol, DATE(timestamp),
+       SUM(CASE WHEN type = 'BUY' THEN quantity ELSE 0 END),
+       SUM(CASE WHEN type = 'SELL' THEN quantity ELSE 0 END),
+       SUM(CASE WHEN type = 'BUY' THEN quantity * price ELSE 0 END),
+       SUM(CASE WHEN type = 'SELL' THEN quantity * price ELSE 0 END),
+       COUNT(*)
+FROM transactions_history
+GROUP BY symbol, DATE(timestamp);
@@ -0,0 +1,15 @@
+-- Technical indicators per bar, maintained incrementally by ingestion.
+-- avg_gain14/avg_loss14 carry Wilder's RSI state from one bar to the next.
+CREATE TABLE IF NOT EXISTS indicators (
+    table_name TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    date DATE NOT NULL,
+    ma10 REAL,
+    ma50 REAL,
+    ma200 REAL,
+    rsi14 REAL,
+    avg_gain14 REAL,
+    avg_loss14 REAL,
+    volatility30 REAL,
+    PRIMARY KEY (table_name, symbol, date)
+);
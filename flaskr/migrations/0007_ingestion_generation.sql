@@ -0,0 +1,4 @@
+-- Bumped whenever a symbol's stored bars change (new or revised bars, full
+-- reloads, retention trims), so cache versions and ETags see every write,
+-- including writes made by another process
+ALTER TABLE ingestion_state ADD COLUMN generation INTEGER NOT NULL DEFAULT 0;
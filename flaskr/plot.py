@@ -1,65 +1,69 @@
-import sqlite3
 import pandas as pd
 import plotly.graph_objects as go
-import json
-from plotly.utils import PlotlyJSONEncoder
 import numpy as np
 from scipy.stats import linregress
+from .chart_encoding import dumps, figure_to_json
+from .downsample import downsample_figure
+from .indicators import RSI_PERIOD, wilder_rsi
 
-def safe_isnan(value):
-    """
-    Safety check if value is NaN. Only floating point numbers are checked.
-    """
-    return isinstance(value, float) and np.isnan(value)
-
-def convert_numpy(obj):
-    """
-    Safety check if value is NaN. Only floating point numbers are checked.
-    """
-    if isinstance(obj, np.ndarray):
-        return [None if safe_isnan(x) else x for x in obj]
-    elif isinstance(obj, dict):
-        return {k: convert_numpy(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_numpy(v) for v in obj]
-    elif isinstance(obj, float):
-        return None if safe_isnan(obj) else obj
-    else:
-        return obj
-
-def plot_returns(db_path, symbol):
-    with sqlite3.connect(db_path) as conn:
-        query = f"SELECT date, close, simple_return, log_return, cumulative_return FROM stock_history WHERE symbol = '{symbol}' ORDER BY date"
-        df = pd.read_sql_query(query, conn)
-
-    df['date'] = pd.to_datetime(df['date'])
-    df['simple_return_yesterday'] = df['simple_return'].shift(1)
+def plot_simple_log_returns(frame):
+    symbol = frame.symbol
+    df = frame.stock
 
     # Create simple and logarithmic return charts
     fig_returns = go.Figure()
     fig_returns.add_trace(go.Scatter(x=df['date'], y=df['simple_return'], mode='lines', name='Simple Return', line=dict(color='blue')))
     fig_returns.add_trace(go.Scatter(x=df['date'], y=df['log_return'], mode='lines', name='Log Return', line=dict(color='orange')))
     fig_returns.update_layout(title=f'{symbol} Simple and Log Returns', xaxis_title='Date', yaxis_title='Return', legend_title='Type of Return')
+    return fig_returns
+
+def plot_return_scatter(frame):
+    symbol = frame.symbol
+    df = frame.stock
 
     # Create a scatter chart
     fig_scatter = go.Figure()
     fig_scatter.add_trace(go.Scatter(x=df['date'], y=df['simple_return']*100, mode='markers', name='Simple Return Scatter', marker=dict(color='black')))
     fig_scatter.update_layout(title=f'{symbol} Simple Return Scatter', xaxis_title='Date', yaxis=dict(title='Return', tickmode='array', tickvals=[i for i in range(-10, 11, 2)], ticktext=[f"{i}%" for i in range(-10, 11, 2)], range=[-10, 10]))
+    return fig_scatter
+
+def plot_cumulative_return(frame):
+    symbol = frame.symbol
+    df = frame.stock
 
     # Create a cumulative return chart
     fig_cumulative = go.Figure()
     fig_cumulative.add_trace(go.Scatter(x=df['date'], y=df['cumulative_return'], mode='lines', name='Cumulative Return', line=dict(color='green')))
     fig_cumulative.update_layout(title=f'{symbol} Cumulative Return', xaxis_title='Date', yaxis_title='Cumulative Return', legend_title='Cumulative Return')
+    return fig_cumulative
+
+def plot_price(frame):
+    symbol = frame.symbol
+    df = frame.stock
 
     # Create a price chart
     fig_price = go.Figure()
     fig_price.add_trace(go.Scatter(x=df['date'], y=df['close'], mode='lines', name='Price', line=dict(color='red')))
     fig_price.update_layout(title=f'{symbol} Price', xaxis_title='Date', yaxis_title='Price', legend_title='Price')
+    return fig_price
+
+def returns_with_yesterday(frame):
+    """The stock's rows that have both today's and yesterday's simple return."""
+    df = frame.stock.copy()
+    df['simple_return_yesterday'] = df['simple_return'].shift(1)
+    return df.dropna()
+
+def plot_simple_vs_yesterday(frame):
+    symbol = frame.symbol
+    df = returns_with_yesterday(frame)
 
-    df = df.dropna()
     fig_simple_vs_yesterday = go.Figure()
     fig_simple_vs_yesterday.add_trace(go.Scatter(x=df['simple_return_yesterday'], y=df['simple_return'], mode='markers', name='Simple Return', marker=dict(color='blue')))
     fig_simple_vs_yesterday.update_layout(title=f'{symbol} Simple Return vs Yesterday', xaxis_title='Yesterday Simple Return', yaxis_title='Today Simple Return')
+    return fig_simple_vs_yesterday
+
+def plot_return_histogram(frame):
+    df = returns_with_yesterday(frame)
 
     # Draw a histogram
     fig_histogram = go.Figure(data=[go.Histogram(
@@ -76,28 +80,22 @@ def plot_returns(db_path, symbol):
     xaxis_title='Simple Return (%)',
     yaxis_title='Frequency'
 )
-    conn.close()
+    return fig_histogram
 
+def plot_returns(frame):
     return {
-        'returns_data': convert_numpy(fig_returns.to_dict()),
-        'scatter_data': convert_numpy(fig_scatter.to_dict()),
-        'cumulative_data': convert_numpy(fig_cumulative.to_dict()),
-        'price_data': convert_numpy(fig_price.to_dict()),
-        'simple_vs_yesterday_data': convert_numpy(fig_simple_vs_yesterday.to_dict()),
-        'histogram_data': convert_numpy(fig_histogram.to_dict())
+        'returns_data': plot_simple_log_returns(frame),
+        'scatter_data': plot_return_scatter(frame),
+        'cumulative_data': plot_cumulative_return(frame),
+        'price_data': plot_price(frame),
+        'simple_vs_yesterday_data': plot_simple_vs_yesterday(frame),
+        'histogram_data': plot_return_histogram(frame)
     }
     
 # Comparison for simple return
-def plot_comparison_with_index(db_path, symbol):
-    with sqlite3.connect(db_path) as conn:
-        stock_query = f"SELECT date, simple_return FROM stock_history WHERE symbol = '{symbol}' ORDER BY date"
-        index_query = "SELECT date, simple_return FROM index_data WHERE symbol = 'SPY' ORDER BY date"
-        
-        df_stock = pd.read_sql_query(stock_query, conn)
-        df_index = pd.read_sql_query(index_query, conn)
-
-    df_stock['date'] = pd.to_datetime(df_stock['date'])
-    df_index['date'] = pd.to_datetime(df_index['date'])
+def plot_comparison_with_index(frame):
+    symbol = frame.symbol
+    df_stock, df_index = frame.stock, frame.index
 
     fig = go.Figure()
 
@@ -125,22 +123,12 @@ def plot_comparison_with_index(db_path, symbol):
         )
     )
 
-    return convert_numpy(fig.to_dict())
+    return fig
 
 #correlation for simple return
-def plot_regression_between_stock_and_index(db_path, symbol):
-    with sqlite3.connect(db_path) as conn:
-        stock_query = f"SELECT date, simple_return FROM stock_history WHERE symbol = '{symbol}' ORDER BY date"
-        index_query = "SELECT date, simple_return FROM index_data WHERE symbol = 'SPY' ORDER BY date"
-        
-        df_stock = pd.read_sql_query(stock_query, conn)
-        df_index = pd.read_sql_query(index_query, conn)
-
-    df_stock['date'] = pd.to_datetime(df_stock['date'])
-    df_index['date'] = pd.to_datetime(df_index['date'])
-
-    df_merged = pd.merge(df_stock, df_index, on='date', suffixes=('_stock', '_index'))
-    df_merged.dropna(inplace=True)
+def plot_regression_between_stock_and_index(frame):
+    symbol = frame.symbol
+    df_merged = frame.aligned[['date', 'simple_return_stock', 'simple_return_index']].dropna()
 
     if df_merged.empty:
         print("No overlapping or valid data between stock and index.")
@@ -164,19 +152,12 @@ def plot_regression_between_stock_and_index(db_path, symbol):
         legend_title='Legend'
     )
 
-    return convert_numpy(fig.to_dict())
+    return fig
 
 #cumulative return comparison
-def plot_cumulative_return_comparison(db_path, symbol):
-    with sqlite3.connect(db_path) as conn:
-        stock_query = f"SELECT date, cumulative_return FROM stock_history WHERE symbol = '{symbol}' ORDER BY date"
-        index_query = "SELECT date, cumulative_return FROM index_data WHERE symbol = 'SPY' ORDER BY date"
-        
-        df_stock = pd.read_sql_query(stock_query, conn)
-        df_index = pd.read_sql_query(index_query, conn)
-
-    df_stock['date'] = pd.to_datetime(df_stock['date'])
-    df_index['date'] = pd.to_datetime(df_index['date'])
+def plot_cumulative_return_comparison(frame):
+    symbol = frame.symbol
+    df_stock, df_index = frame.stock, frame.index
 
     fig = go.Figure()
 
@@ -195,29 +176,18 @@ def plot_cumulative_return_comparison(db_path, symbol):
         legend_title='Legend'
     )
 
-    return convert_numpy(fig.to_dict())
+    return fig
 
 #volatility comparison
-def calculate_volatility(db_path, symbol):
-    with sqlite3.connect(db_path) as conn:
-        stock_query = f"SELECT date, close FROM stock_history WHERE symbol = '{symbol}' ORDER BY date"
-        df_stock = pd.read_sql_query(stock_query, conn)
-        
-        index_query = "SELECT date, close FROM index_data WHERE symbol = 'SPY' ORDER BY date"
-        df_index = pd.read_sql_query(index_query, conn)
-        
-    df_stock['date'] = pd.to_datetime(df_stock['date'])
-    df_index['date'] = pd.to_datetime(df_index['date'])
-    
-    df_stock['returns'] = df_stock['close'].pct_change()
-    df_index['returns'] = df_index['close'].pct_change()
-    
-    df_stock['volatility'] = df_stock['returns'].rolling(window=30).std() * np.sqrt(252)
-    df_index['volatility'] = df_index['returns'].rolling(window=30).std() * np.sqrt(252)
+def calculate_volatility(frame):
+    symbol = frame.symbol
+    # 30-day annualized volatility maintained by ingestion
+    df_stock = frame.indicators('stock')
+    df_index = frame.indicators('index')
 
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=df_stock['date'], y=df_stock['volatility'], mode='lines', name=f'{symbol} Volatility'))
-    fig.add_trace(go.Scatter(x=df_index['date'], y=df_index['volatility'], mode='lines', name='SPY Volatility'))
+    fig.add_trace(go.Scatter(x=df_stock['date'], y=df_stock['volatility30'], mode='lines', name=f'{symbol} Volatility'))
+    fig.add_trace(go.Scatter(x=df_index['date'], y=df_index['volatility30'], mode='lines', name='SPY Volatility'))
 
     fig.update_layout(
         title=f'30-Day Historical Volatility Comparison: {symbol} vs SPY',
@@ -228,25 +198,18 @@ def calculate_volatility(db_path, symbol):
 
     return fig
 
-def calculate_and_plot_rsi(db_path, symbol, window=14):
-    with sqlite3.connect(db_path) as conn:
-        query = f"SELECT date, close FROM stock_history WHERE symbol = '{symbol}' ORDER BY date"
-        df = pd.read_sql_query(query, conn)
-    
-    df['date'] = pd.to_datetime(df['date'])
-    df['change'] = df['close'].diff()
-
-    df['gain'] = np.where(df['change'] > 0, df['change'], 0)
-    df['loss'] = np.where(df['change'] < 0, -df['change'], 0)
-
-    df['avg_gain'] = df['gain'].rolling(window=window, min_periods=1).mean()
-    df['avg_loss'] = df['loss'].rolling(window=window, min_periods=1).mean()
-
-    df['rs'] = df['avg_gain'] / df['avg_loss']
-    df['rsi'] = 100 - (100 / (1 + df['rs']))
+def calculate_and_plot_rsi(frame, window=RSI_PERIOD):
+    symbol = frame.symbol
+    if window == RSI_PERIOD:
+        df = frame.indicators('stock')
+        rsi = df['rsi14']
+    else:
+        # Only the 14-day RSI is stored; other windows use the same Wilder smoothing
+        df = frame.stock[frame.stock['close'].notna()]
+        rsi = wilder_rsi(df['close'].to_numpy(dtype=float), window)
 
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=df['date'], y=df['rsi'], mode='lines', name='RSI'))
+    fig.add_trace(go.Scatter(x=df['date'], y=rsi, mode='lines', name='RSI'))
     fig.update_layout(
         title=f'RSI for {symbol}',
         xaxis_title='Date',
@@ -260,26 +223,51 @@ def calculate_and_plot_rsi(db_path, symbol, window=14):
 
     return fig
 
-def plot_moving_averages(db_path, symbol):
-    conn = sqlite3.connect(db_path)
-    
-    data = pd.read_sql(f"SELECT date, close FROM stock_history WHERE symbol='{symbol}' ORDER BY date", conn)
-    data['date'] = pd.to_datetime(data['date'])
-    
-    data['MA10'] = data['close'].rolling(window=10).mean()
-    data['MA50'] = data['close'].rolling(window=50).mean()
-    data['MA200'] = data['close'].rolling(window=200).mean()
+def plot_moving_averages(frame):
+    symbol = frame.symbol
+    data = frame.stock
+    averages = frame.indicators('stock')
     
     fig = go.Figure()
     fig.add_trace(go.Scatter(x=data['date'], y=data['close'], mode='lines', name='Close Price', line=dict(color='blue')))
-    fig.add_trace(go.Scatter(x=data['date'], y=data['MA10'], mode='lines', name='10-day MA', line=dict(color='red')))
-    fig.add_trace(go.Scatter(x=data['date'], y=data['MA50'], mode='lines', name='50-day MA', line=dict(color='green')))
-    fig.add_trace(go.Scatter(x=data['date'], y=data['MA200'], mode='lines', name='200-day MA', line=dict(color='orange')))
+    fig.add_trace(go.Scatter(x=averages['date'], y=averages['ma10'], mode='lines', name='10-day MA', line=dict(color='red')))
+    fig.add_trace(go.Scatter(x=averages['date'], y=averages['ma50'], mode='lines', name='50-day MA', line=dict(color='green')))
+    fig.add_trace(go.Scatter(x=averages['date'], y=averages['ma200'], mode='lines', name='200-day MA', line=dict(color='orange')))
 
     fig.update_layout(title=f'Moving Averages for {symbol}',
                       xaxis_title='Date',
                       yaxis_title='Price',
                       legend_title='Legend')
-    
-    conn.close()
+
     return fig
+
+
+# Every chart of the plot page by the name used in /api/plot/<symbol>/<chart>,
+# in page order
+CHARTS = {
+    'returns': plot_simple_log_returns,
+    'scatter': plot_return_scatter,
+    'histogram': plot_return_histogram,
+    'simple_vs_yesterday': plot_simple_vs_yesterday,
+    'cumulative': plot_cumulative_return,
+    'price': plot_price,
+    'comparison': plot_comparison_with_index,
+    'regression': plot_regression_between_stock_and_index,
+    'cumulative_comparison': plot_cumulative_return_comparison,
+    'volatility': calculate_volatility,
+    'rsi': calculate_and_plot_rsi,
+    'moving_averages': plot_moving_averages,
+}
+
+
+def build_chart(frame, name, max_points=None):
+    """Build one registered chart and serialize it to JSON, with numeric
+    series as typed arrays (see chart_encoding). Time series longer than
+    `max_points` are downsampled.
+
+    Raises KeyError for an unknown chart name.
+    """
+    figure = CHARTS[name](frame)
+    if max_points and isinstance(figure, go.Figure):
+        downsample_figure(figure, max_points)
+    return figure_to_json(figure) if isinstance(figure, go.Figure) else dumps(figure)
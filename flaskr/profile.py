@@ -38,20 +38,15 @@ def get_plot_data():
     optimizer = PortfolioOptimizer(db_path=db_path, user_id=user_id)
     symbols = optimizer.get_user_symbols(user_id)
     
-    # Assuming the weights are correctly stored and simulation results are calculated
-    portfolio_volatilities, portfolio_returns, sharpe_ratios, weights = optimizer.random_portfolios(num_portfolios=30000)
-    simulation_results_df = optimizer.process_simulation_results(portfolio_volatilities, portfolio_returns, sharpe_ratios, weights)
+    frontier = optimizer.efficient_frontier(num_points=50)
 
-    if simulation_results_df.empty:
+    if frontier is None:
         return jsonify({"error": "No simulation results available."}), 500
 
-    volatilities = simulation_results_df['Volatility'].tolist()
-    returns = simulation_results_df['Return'].tolist()
-    max_sharpe_idx = simulation_results_df['Sharpe Ratio'].idxmax()
-    min_vol_idx = simulation_results_df['Volatility'].idxmin()
-
-    max_sharpe_weights = json.loads(simulation_results_df.at[max_sharpe_idx, 'Weights'])
-    min_vol_weights = json.loads(simulation_results_df.at[min_vol_idx, 'Weights'])
+    volatilities = frontier['volatilities'].tolist()
+    returns = frontier['returns'].tolist()
+    max_sharpe_weights = frontier['max_sharpe_weights'].tolist()
+    min_vol_weights = frontier['min_vol_weights'].tolist()
 
     user_portfolio_weights_df, weights_array = optimizer.calculate_portfolio_weights(user_id)
     user_portfolio_weights = user_portfolio_weights_df['weight'].values
@@ -63,6 +58,7 @@ def get_plot_data():
             "returns": returns,
             "volatilities": volatilities
         },
+        "converged": frontier['converged'],
         "user_portfolio": {
             "performance": user_perf,
             "weights": user_portfolio_weights.tolist()
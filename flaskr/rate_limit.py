@@ -0,0 +1,159 @@
+import threading
+import time
+
+
+class RateLimitExceeded(RuntimeError):
+    """Raised when an upstream call waited longer than allowed for a token."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` calls per `per` seconds with bursts up to `capacity`."""
+
+    def __init__(self, rate, per=60.0, capacity=None):
+        self.lock = threading.Lock()
+        self.waiting = 0
+        self.max_waiting = 0
+        self.acquired = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.configure(rate, per, capacity)
+
+    def configure(self, rate, per=60.0, capacity=None):
+        with self.lock:
+            self.rate = rate / per
+            self.capacity = capacity or rate
+            self.tokens = self.capacity
+            self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, timeout=None):
+        """Block until a token is available. Returns False if `timeout` seconds pass first."""
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        with self.lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            while True:
+                with self.lock:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        self.acquired += 1
+                        self.total_wait += now - started
+                        return True
+                    delay = (1 - self.tokens) / self.rate
+                    if deadline is not None and now + delay > deadline:
+                        self.rejected += 1
+                        return False
+                time.sleep(delay)
+        finally:
+            with self.lock:
+                self.waiting -= 1
+
+    def stats(self):
+        with self.lock:
+            self._refill(time.monotonic())
+            return {
+                'queue_depth': self.waiting,
+                'max_queue_depth': self.max_waiting,
+                'tokens_available': round(self.tokens, 2),
+                'acquired': self.acquired,
+                'rejected': self.rejected,
+                'average_wait_seconds': self.total_wait / self.acquired if self.acquired else 0.0,
+            }
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one execution."""
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+            self.followers = 0
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        """Run fn() unless an identical call is in flight; then wait for and share its result."""
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = self._Call()
+                self.executed += 1
+            else:
+                call.followers += 1
+                self.shared += 1
+
+        if leader:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self.lock:
+                    del self.calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self):
+        with self.lock:
+            return {
+                'in_flight': len(self.calls),
+                'waiting_followers': sum(call.followers for call in self.calls.values()),
+                'executed': self.executed,
+                'shared': self.shared,
+            }
+
+
+# Process-wide state shared by every Alpha Vantage client. The default
+# matches the free API plan; create_app resizes it from the config.
+upstream_limiter = TokenBucket(rate=5, per=60.0)
+upstream_flight = SingleFlight()
+upstream_max_wait = 120
+# Page views and trades give up quickly instead of queueing behind
+# background ingestion for the whole quota window
+upstream_interactive_max_wait = 5
+
+
+def configure_upstream(calls_per_minute, burst=None, max_wait=120, interactive_max_wait=5):
+    global upstream_max_wait, upstream_interactive_max_wait
+    upstream_limiter.configure(calls_per_minute, 60.0, burst)
+    upstream_max_wait = max_wait
+    upstream_interactive_max_wait = interactive_max_wait
+
+
+def call_upstream(key, fn, max_wait=None):
+    """Run an upstream call under the global rate limit, sharing it with identical concurrent calls.
+
+    `max_wait` caps the seconds spent waiting for a token (default: the
+    configured background wait). Raises RateLimitExceeded when no token
+    becomes available in time.
+    """
+    max_wait = upstream_max_wait if max_wait is None else max_wait
+
+    def limited():
+        if not upstream_limiter.acquire(timeout=max_wait):
+            raise RateLimitExceeded(f'Alpha Vantage rate limit: no capacity for {key} within {max_wait}s')
+        return fn()
+    return upstream_flight.do(key, limited)
+
+
+def upstream_metrics():
+    return {'rate_limiter': upstream_limiter.stats(), 'single_flight': upstream_flight.stats()}
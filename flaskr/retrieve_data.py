@@ -1,41 +1,142 @@
 import os
 import requests
 import pandas
+from concurrent.futures import ThreadPoolExecutor, wait
+from flask import current_app, has_app_context, has_request_context
+from .api_cache import get_api_cache
+from . import rate_limit
+from .rate_limit import RateLimitExceeded, call_upstream
+
+# Keys Alpha Vantage uses for throttling and error payloads; never cached
+UNCACHEABLE_KEYS = ('Note', 'Information', 'Error Message')
+# Seconds allowed for each upstream request
+REQUEST_TIMEOUT = 10
+
+DEFAULT_BASE_URL = 'https://www.alphavantage.co/query'
+
+# Shared by all instances so concurrent page views reuse the same threads
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='alpha-vantage')
+
+
+class CacheMiss(Exception):
+    """Raised by a cache-only lookup that would have to go upstream."""
+
+
+def get_base_url():
+    """The configured Alpha Vantage endpoint, so a local stand-in server can replace the real API."""
+    if has_app_context():
+        return current_app.config.get('ALPHAVANTAGE_BASE_URL') or DEFAULT_BASE_URL
+    return DEFAULT_BASE_URL
 
 class Alpha_Vantage_Data:
-    def __init__(self, symbol):
+    def __init__(self, symbol, cache=None, timeout=REQUEST_TIMEOUT, max_wait=None):
         self.symbol = symbol.upper()
         self.api_key = os.getenv('ALPHAVANTAGE_API_KEY')
-        self.base_url = 'https://www.alphavantage.co/query'
-        
-    def get_overview(self):
+        self.base_url = get_base_url()
+        self.cache = cache if cache is not None else get_api_cache()
+        self.timeout = timeout
+        # Clients built while serving a request fail fast when the quota is used up
+        if max_wait is None and has_request_context():
+            max_wait = rate_limit.upstream_interactive_max_wait
+        self.max_wait = max_wait
+
+    def call_cached(self, name):
+        """Run a getter against the response cache alone; raises CacheMiss if it needs the network."""
+        return getattr(self, name)(source='cache')
+
+    def fetch_concurrently(self, *method_names, timeout=None):
+        """Call several getters of this object in parallel.
+
+        Returns a dict mapping each method name to its result. A call that
+        raises or does not finish within `timeout` seconds (default: the
+        per-request timeout) maps to None, so callers can render whatever
+        did arrive. Getters answered by the response cache run right here;
+        only the rest take a worker thread.
+        """
+        results, futures = {}, {}
+        for name in method_names:
+            try:
+                results[name] = self.call_cached(name)
+            except CacheMiss:
+                # The cache was just checked, so the worker goes straight upstream
+                futures[name] = _executor.submit(getattr(self, name), source='upstream')
+            except Exception as e:
+                print(f"{name} for {self.symbol} failed: {e}")
+                results[name] = None
+        if futures:
+            wait(futures.values(), timeout=self.timeout if timeout is None else timeout)
+
+        for name, future in futures.items():
+            if not future.done():
+                future.cancel()
+                print(f"{name} for {self.symbol} timed out")
+                results[name] = None
+            elif future.exception() is not None:
+                print(f"{name} for {self.symbol} failed: {future.exception()}")
+                results[name] = None
+            else:
+                results[name] = future.result()
+        return results
+
+    def _get_json(self, params, source=None):
+        """GET a query, serving it from the response cache when possible.
+
+        `source` restricts the lookup: 'cache' raises CacheMiss instead of
+        calling upstream, 'upstream' skips the cache read. Returns the
+        decoded payload, or None if the request failed.
+        """
+        function = params['function']
+        outputsize = params.get('outputsize', '')
+        if self.cache is not None and source != 'upstream':
+            payload = self.cache.get(function, self.symbol, outputsize)
+            # A full daily series is a superset of the compact one
+            if payload is None and function == 'TIME_SERIES_DAILY_ADJUSTED' and outputsize != 'full':
+                payload = self.cache.get(function, self.symbol, 'full')
+            if payload is not None:
+                return payload
+        if source == 'cache':
+            raise CacheMiss(function, self.symbol, outputsize)
+
+        try:
+            # Identical concurrent requests share one rate-limited upstream call
+            return call_upstream((function, self.symbol, outputsize), lambda: self._request(params),
+                                 max_wait=self.max_wait)
+        except RateLimitExceeded as e:
+            print(e)
+            return None
+
+    def _request(self, params):
+        response = requests.get(self.base_url, params=dict(params, apikey=self.api_key), timeout=self.timeout)
+        if not response.ok:
+            return None
+        payload = response.json()
+        if self.cache is not None and not any(key in payload for key in UNCACHEABLE_KEYS):
+            self.cache.set(params['function'], self.symbol, params.get('outputsize', ''), payload)
+        return payload
+
+    def get_overview(self, source=None):
         params = {
             "function": "OVERVIEW",
-            "symbol": self.symbol,
-            "apikey": self.api_key
+            "symbol": self.symbol
         }
-        response = requests.get(self.base_url, params=params)
-        return response.json() if response.ok else None
+        return self._get_json(params, source)
 
-    def get_news_sentiment(self):
+    def get_news_sentiment(self, source=None):
         params = {
             "function": "NEWS_SENTIMENT",
-            "tickers": self.symbol,
-            "apikey": self.api_key
+            "tickers": self.symbol
         }
-        response = requests.get(self.base_url, params=params)
-        return response.json()['feed'][:5] if response.ok else None
+        data = self._get_json(params, source)
+        return data['feed'][:5] if data else None
 
-    def get_daily_stock_price(self):
+    def get_daily_stock_price(self, source=None):
         params = {
             "function": "TIME_SERIES_DAILY_ADJUSTED",
             "symbol": self.symbol,
-            "apikey": self.api_key,
             "outputsize": "full"
         }
-        response = requests.get(self.base_url, params=params)
-        if response.ok:
-            data = response.json()
+        data = self._get_json(params, source)
+        if data:
             closing_prices = {}
             sorted_dates = sorted(data['Time Series (Daily)'].keys(), reverse=True)
             for date in sorted_dates[:252*5]:
@@ -44,16 +145,14 @@ class Alpha_Vantage_Data:
         else:
             return None
         
-    def get_intraday_stock_price(self):
+    def get_intraday_stock_price(self, source=None):
         params = {
             "function": "TIME_SERIES_INTRADAY",
             "symbol": self.symbol,
-            "interval": "1min",
-            "apikey": self.api_key
+            "interval": "1min"
         }
-        response = requests.get(self.base_url, params=params)
-        if response.ok:
-            data = response.json()
+        data = self._get_json(params, source)
+        if data:
             latest_timestamp = max(data['Time Series (1min)'].keys())
             latest_price = data['Time Series (1min)'][latest_timestamp]['4. close']
             return latest_price, latest_timestamp
@@ -61,18 +160,46 @@ class Alpha_Vantage_Data:
             return None, None
         
         
-    def get_daily_stock_price_show(self):
+    def get_daily_stock_price_show(self, source=None):
         params = {
             "function": "TIME_SERIES_DAILY_ADJUSTED",
-            "symbol": self.symbol,
-            "apikey": self.api_key
+            "symbol": self.symbol
         }
-        response = requests.get(self.base_url, params=params)
-        if response.ok:
-            data = response.json()
+        data = self._get_json(params, source)
+        if data:
             latest_timestamp = max(data["Time Series (Daily)"].keys())
             latest_price = data["Time Series (Daily)"][latest_timestamp]['5. adjusted close']
             return latest_price, latest_timestamp
         else:
             return None, None
 
+
+def fetch_latest_prices(symbols, timeout=REQUEST_TIMEOUT):
+    """Look up the latest daily price of each distinct symbol in parallel.
+
+    Returns a dict mapping each symbol to its price string, or to None when
+    the lookup failed or timed out. Cached prices are read without a
+    worker thread.
+    """
+    prices, futures = {}, {}
+    for symbol in dict.fromkeys(symbols):
+        # Clients are built here so the workers never need the app context
+        client = Alpha_Vantage_Data(symbol)
+        try:
+            prices[symbol] = client.call_cached('get_daily_stock_price_show')[0]
+        except CacheMiss:
+            futures[symbol] = _executor.submit(client.get_daily_stock_price_show, source='upstream')
+        except Exception as e:
+            print(f"Price lookup for {symbol} failed: {e}")
+            prices[symbol] = None
+    if futures:
+        wait(futures.values(), timeout=timeout)
+
+    for symbol, future in futures.items():
+        if not future.done() or future.exception() is not None:
+            future.cancel()
+            print(f"Price lookup for {symbol} failed")
+            prices[symbol] = None
+        else:
+            prices[symbol] = future.result()[0]
+    return prices
@@ -0,0 +1,177 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from .api_cache import last_published_date, seconds_until_next_close
+from .db import get_connection
+from .store_history import clean_old_data, fetch_and_process_data, get_last_ingested_date, update_spy_index_data
+
+INDEX_SYMBOL = 'SPY'
+
+
+def record_symbol_view(db, symbol):
+    """Remember that a symbol's plot page was opened so it joins the watch set.
+
+    Written at most once a day per symbol; the watch set only looks at days.
+    """
+    seen_today = db.execute(
+        "SELECT 1 FROM symbol_views WHERE symbol = ? AND date(viewed_at) = date('now')", (symbol,)
+    ).fetchone()
+    if seen_today is not None:
+        return
+    db.execute('INSERT OR REPLACE INTO symbol_views (symbol, viewed_at) VALUES (?, CURRENT_TIMESTAMP)', (symbol,))
+    db.commit()
+
+
+def get_watch_set(db_path, recent_days=7):
+    """Symbols to keep fresh: every held symbol plus recently viewed ones (SPY excluded)."""
+    with get_connection(db_path, readonly=True) as conn:
+        rows = conn.execute('''
+        SELECT symbol FROM user_assets
+        UNION
+        SELECT symbol FROM symbol_views WHERE viewed_at >= datetime('now', ?)
+        ''', (f'-{recent_days} days',)).fetchall()
+    return sorted({row[0] for row in rows} - {INDEX_SYMBOL})
+
+
+def refresh_symbols(db_path, symbols, pause=0):
+    """Bring SPY and the given symbols up to date.
+
+    `pause` seconds are slept between upstream downloads to stay inside
+    the API quota. Returns the number of bars written per symbol.
+    """
+    clean_old_data(db_path, 'stock_history')
+    clean_old_data(db_path, 'index_data')
+
+    written = {INDEX_SYMBOL: update_spy_index_data(db_path)}
+    for symbol in symbols:
+        if pause:
+            time.sleep(pause)
+        try:
+            written[symbol] = fetch_and_process_data(symbol, db_path)
+        except Exception as e:
+            print(f"Failed to refresh {symbol}: {e}")
+            written[symbol] = 0
+    return written
+
+
+def backfill_missing(db_path, symbol):
+    """Download a symbol that has no stored bars, and SPY only if it has none either.
+
+    Meant for the request path: retention cleanup and refreshes of stored
+    symbols are left to the scheduled refresh. Returns the bars written.
+    """
+    with get_connection(db_path, readonly=True) as conn:
+        has_index = conn.execute('SELECT 1 FROM index_data WHERE symbol = ? LIMIT 1', (INDEX_SYMBOL,)).fetchone()
+    if has_index is None:
+        update_spy_index_data(db_path)
+    try:
+        return fetch_and_process_data(symbol, db_path)
+    except Exception as e:
+        print(f"Failed to download {symbol}: {e}")
+        return 0
+
+
+def refresh_watch_set(app):
+    with app.app_context():
+        db_path = app.config['DATABASE']
+        return refresh_symbols(db_path, get_watch_set(db_path, app.config['REFRESH_RECENT_DAYS']),
+                               pause=app.config['REFRESH_PAUSE_SECONDS'])
+
+
+def is_stale(db_path, symbol):
+    """True when a symbol has no stored bars or lacks the latest published daily bar."""
+    with get_connection(db_path, readonly=True) as conn:
+        last_date = get_last_ingested_date(conn, 'stock_history', symbol)
+    return last_date is None or str(last_date)[:10] < last_published_date()
+
+
+# One worker so backfills queue up behind each other instead of
+# competing for the writer lock and the API quota
+_backfill_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='backfill')
+# Symbols queued or being backfilled; each appears in the queue at most once
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def queue_backfill(app, symbols):
+    """Backfill traded symbols in the background, off the request thread.
+
+    Only symbols whose bars are missing or stale are downloaded; SPY and
+    retention cleanup are left to the scheduled refresh. Symbols already
+    waiting in the queue are skipped. Returns the submitted futures.
+    """
+    with _pending_lock:
+        symbols = [symbol for symbol in dict.fromkeys(symbols) if symbol not in _pending]
+        _pending.update(symbols)
+
+    def run(symbol):
+        try:
+            with app.app_context():
+                db_path = app.config['DATABASE']
+                if is_stale(db_path, symbol):
+                    fetch_and_process_data(symbol, db_path)
+        except Exception as e:
+            print(f"Background backfill of {symbol} failed: {e}")
+        finally:
+            with _pending_lock:
+                _pending.discard(symbol)
+    return [_backfill_executor.submit(run, symbol) for symbol in symbols]
+
+
+def seconds_until_next_refresh(app):
+    interval = app.config['REFRESH_INTERVAL']
+    return seconds_until_next_close() if interval is None else interval
+
+
+class RefreshScheduler(threading.Thread):
+    """Daemon thread that refreshes the watch set after each market close or on an interval."""
+
+    def __init__(self, app):
+        super().__init__(name='refresh-scheduler', daemon=True)
+        self.app = app
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(seconds_until_next_refresh(self.app)):
+            try:
+                refresh_watch_set(self.app)
+            except Exception as e:
+                print(f"Scheduled refresh failed: {e}")
+
+    def stop(self):
+        self.stopped.set()
+
+
+def init_scheduler(app):
+    """Start the in-process scheduler when REFRESH_SCHEDULER is enabled."""
+    if not app.config['REFRESH_SCHEDULER'] or 'refresh_scheduler' in app.extensions:
+        return None
+    scheduler = RefreshScheduler(app)
+    app.extensions['refresh_scheduler'] = scheduler
+    scheduler.start()
+    return scheduler
+
+
+@click.command('refresh-data')
+@click.option('--symbol', 'symbols', multiple=True, help='Refresh only these symbols (repeatable).')
+@click.option('--loop', is_flag=True, help='Keep running and refresh on the configured schedule.')
+@with_appcontext
+def refresh_data_command(symbols, loop):
+    """Download new daily bars for the watch set."""
+    app = current_app._get_current_object()
+    while True:
+        if symbols:
+            written = refresh_symbols(app.config['DATABASE'], list(symbols),
+                                      pause=app.config['REFRESH_PAUSE_SECONDS'])
+        else:
+            written = refresh_watch_set(app)
+        for symbol, count in written.items():
+            click.echo(f'{symbol}: {count} bars written')
+        if not loop:
+            break
+        time.sleep(seconds_until_next_refresh(app))
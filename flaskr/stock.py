@@ -16,19 +16,22 @@ def show_stock_info(symbol=None):
     overview_data = None
     current_price_data = None
     news_data = []
+    date = None
 
     if symbol:
         av_data = Alpha_Vantage_Data(symbol)
-        overview_data = av_data.get_overview()
+        # The three lookups are independent, so issue them in parallel
+        results = av_data.fetch_concurrently('get_overview', 'get_daily_stock_price_show', 'get_news_sentiment')
+
+        overview_data = results['get_overview']
         if not overview_data:
             flash(f'Stock symbol not found or error in API call: {symbol}', 'error')
             
-        current_price_data, date = av_data.get_daily_stock_price_show()
-        print(current_price_data)
+        current_price_data, date = results['get_daily_stock_price_show'] or (None, None)
         if not current_price_data:
             flash(f'Stock symbol not found or error in API call: {symbol}', 'error')
 
-        news_data = av_data.get_news_sentiment()
+        news_data = results['get_news_sentiment']
         if not news_data:
             flash(f'Stock symbol not found or error in API call: {symbol}', 'error')
     return render_template(
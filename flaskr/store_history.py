@@ -1,137 +1,282 @@
-from flask import Flask, jsonify, request, render_template, current_app
-import json
-import sqlite3
 from datetime import datetime, timedelta
 import pandas as pd
 import numpy as np
 from alpha_vantage.timeseries import TimeSeries
+from alpha_vantage.alphavantage import AlphaVantage
 import os
-from .plot import plot_returns
-from plotly.utils import PlotlyJSONEncoder 
-from .retrieve_data import Alpha_Vantage_Data
+import itertools
+from .retrieve_data import get_base_url
+from .db import get_connection
+from .rate_limit import call_upstream
+from .chart_cache import invalidate_charts
+from .ef_data_prep import statistics_cache
+from .columnar_store import export_symbols
+from .indicators import update_indicators
 
 
-app = Flask(__name__)
 def clean_old_data(db_path, table_name='stock_history'):
-    with sqlite3.connect(db_path) as conn:
+    """Drop bars older than the retention window and rebase the trimmed symbols.
+
+    Returns the number of rows deleted.
+    """
+    with get_connection(db_path) as conn:
         cursor = conn.cursor()
-        five_years_ago = datetime.now() - timedelta(days=5*365)
+        five_years_ago = (datetime.now() - timedelta(days=5*365)).strftime('%Y-%m-%d')
+        trimmed = [row[0] for row in cursor.execute(f'''
+        SELECT DISTINCT symbol FROM {table_name} WHERE date < ?
+        ''', (five_years_ago,))]
         cursor.execute(f'''
         DELETE FROM {table_name}
         WHERE date < ?
-        ''', (five_years_ago.strftime('%Y-%m-%d'),))
+        ''', (five_years_ago,))
+        deleted = cursor.rowcount
+        # Stored indicators of the remaining bars stay valid; Wilder's RSI
+        # state carries forward from the first kept bar
+        cursor.execute('DELETE FROM indicators WHERE table_name = ? AND date < ?', (table_name, five_years_ago))
+        # Cumulative returns are relative to the first stored bar, which just moved
+        for symbol in trimmed:
+            update_cumulative_returns(conn, table_name, symbol)
         conn.commit()
+    publish_changes(db_path, table_name, trimmed)
+    return deleted
 
-def fetch_and_process_data(symbol, db_path, is_index=False):
-    with sqlite3.connect(db_path) as conn:
-        cursor = conn.cursor()
-        
-        ts = TimeSeries(key=os.getenv('ALPHAVANTAGE_API_KEY'), output_format='pandas')
-        data, meta_data = ts.get_daily_adjusted(symbol=symbol, outputsize='full')
-        data = data[data.index >= (datetime.now() - timedelta(days=5*365+1))]
-        
-        data['symbol'] = symbol
-        data['date'] = data.index.strftime('%Y-%m-%d')
-        data['simple_return'] = data['4. close'].pct_change()
-        data['log_return'] = np.log(data['4. close'] / data['4. close'].shift(1))
-        
-        table_name = 'index_data' if is_index else 'stock_history'
-        
-        for index, row in data.iterrows():
-            cursor.execute(f'''
-            SELECT COUNT(*) FROM {table_name} WHERE symbol=? AND date=?
-            ''', (row['symbol'], row['date']))
-            exists = cursor.fetchone()[0] > 0
-            
-            if exists:
-                cursor.execute(f'''
-                UPDATE {table_name} SET
-                open=?, high=?, low=?, close=?, volume=?, adjusted_close=?, simple_return=?, log_return=?
-                WHERE symbol=? AND date=?
-                ''', (row['1. open'], row['2. high'], row['3. low'], row['4. close'], row['6. volume'],
-                      row['5. adjusted close'], row['simple_return'], row['log_return'], row['symbol'], row['date']))
-            else:
-                cursor.execute(f'''
-                INSERT INTO {table_name} 
-                (symbol, date, open, high, low, close, volume, adjusted_close, simple_return, log_return)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (row['symbol'], row['date'], row['1. open'], row['2. high'], row['3. low'], 
-                      row['4. close'], row['6. volume'], row['5. adjusted close'], 
-                      row['simple_return'], row['log_return']))
-                
-        conn.commit()
 
+def publish_changes(db_path, table_name, symbols):
+    """Make committed bar changes visible to the caches.
 
-def update_spy_index_data(db_path):
-    ts = TimeSeries(key=os.getenv('ALPHAVANTAGE_API_KEY'), output_format='pandas')
-    symbol = 'SPY'
+    The columnar copies are exported first and only then is the write
+    generation bumped, so a reader can only build a version key that
+    includes the new generation once the export has finished. In-process
+    caches are dropped last.
+    """
+    if not symbols:
+        return
+    export_symbols(db_path, table_name, symbols)
+    with get_connection(db_path) as conn:
+        bump_data_generation(conn, table_name, symbols)
+    for symbol in symbols:
+        invalidate_charts(symbol)
+        statistics_cache.invalidate(symbol)
 
-    try:
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-
-            data, meta_data = ts.get_daily_adjusted(symbol=symbol, outputsize='full')
-            data = data[['1. open', '2. high', '3. low', '4. close', '6. volume', '5. adjusted close']]
-            data.reset_index(inplace=True)
-            data.rename(columns={
-                'index': 'date',
-                '1. open': 'open',
-                '2. high': 'high',
-                '3. low': 'low',
-                '4. close': 'close',
-                '6. volume': 'volume',
-                '5. adjusted close': 'adjusted_close'
-            }, inplace=True)
-
-            data['date'] = pd.to_datetime(data['date'])
-            five_years_ago = datetime.now() - timedelta(days=5 * 365)
-            data = data[data['date'] >= five_years_ago]
-
-            data['simple_return'] = data['close'].pct_change()
-            data['log_return'] = np.log(data['close'] / data['close'].shift(1))
-
-            data.fillna(0, inplace=True)
-
-            data['date'] = data['date'].dt.strftime('%Y-%m-%d')
-
-            data_tuples = data.to_records(index=False).tolist()
-            insert_query = '''
-                INSERT OR REPLACE INTO index_data
-                (symbol, date, open, high, low, close, volume, adjusted_close, simple_return, log_return)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            '''
-            cursor.executemany(insert_query, [(symbol, *row) for row in data_tuples])
-
-            conn.commit()
-            print(f"{len(data_tuples)} rows processed for symbol {symbol}.")
+# outputsize='compact' returns the latest 100 bars; keep a margin so the
+# fetched window always overlaps the last stored bar
+COMPACT_MAX_MISSING_DAYS = 95
+RETENTION_DAYS = 5 * 365
+BAR_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'adjusted_close']
 
-    except Exception as e:
-        print(f"An error occurred: {e}")
 
-def calculate_and_update_cumulative_return(db_path, symbol):
-    with sqlite3.connect(db_path) as conn:
-        cursor = conn.cursor()
+def get_last_ingested_date(conn, table_name, symbol):
+    """Return the last bar date stored for a symbol, or None if it was never ingested."""
+    row = conn.execute(
+        'SELECT last_date FROM ingestion_state WHERE table_name=? AND symbol=?',
+        (table_name, symbol)
+    ).fetchone()
+    # A row can exist with an empty date when only its generation was bumped
+    return row[0] if row and row[0] else None
+
+
+def set_last_ingested_date(conn, table_name, symbol, last_date):
+    # An upsert, so the row's generation survives
+    conn.execute('''
+    INSERT INTO ingestion_state (table_name, symbol, last_date, updated_at)
+    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(table_name, symbol) DO UPDATE SET
+        last_date = excluded.last_date,
+        updated_at = excluded.updated_at
+    ''', (table_name, symbol, last_date))
+
+
+def bump_data_generation(conn, table_name, symbols):
+    """Mark the symbols' stored bars as changed; part of every cache version."""
+    conn.executemany('''
+    INSERT INTO ingestion_state (table_name, symbol, last_date, updated_at, generation)
+    VALUES (?, ?, '', CURRENT_TIMESTAMP, 1)
+    ON CONFLICT(table_name, symbol) DO UPDATE SET
+        generation = generation + 1,
+        updated_at = CURRENT_TIMESTAMP
+    ''', [(table_name, symbol) for symbol in symbols])
+
+
+def choose_outputsize(last_date, today=None):
+    """Pick 'compact' when the missing trading days fit in the compact window."""
+    if last_date is None:
+        return 'full'
+    today = today or datetime.now().strftime('%Y-%m-%d')
+    missing_days = np.busday_count(last_date, today)
+    return 'compact' if missing_days < COMPACT_MAX_MISSING_DAYS else 'full'
+
+
+def make_time_series():
+    """A pandas TimeSeries client pointed at the configured Alpha Vantage endpoint."""
+    # The library reads its endpoint from a class attribute
+    AlphaVantage._ALPHA_VANTAGE_API_URL = get_base_url() + '?'
+    return TimeSeries(key=os.getenv('ALPHAVANTAGE_API_KEY'), output_format='pandas')
+
+
+def download_daily_bars(symbol, outputsize):
+    """Download daily adjusted bars, oldest first, with returns computed."""
+    ts = make_time_series()
+    # Shares the process-wide Alpha Vantage rate limit, and concurrent
+    # refreshes of the same symbol share one download
+    data, meta_data = call_upstream(
+        ('TimeSeries.get_daily_adjusted', symbol, outputsize),
+        lambda: ts.get_daily_adjusted(symbol=symbol, outputsize=outputsize)
+    )
+    data = data.sort_index()
+    data = data[data.index >= (datetime.now() - timedelta(days=RETENTION_DAYS + 1))]
+    data = data.rename(columns={
+        '1. open': 'open',
+        '2. high': 'high',
+        '3. low': 'low',
+        '4. close': 'close',
+        '5. adjusted close': 'adjusted_close',
+        '6. volume': 'volume'
+    })[BAR_COLUMNS]
+
+    data['date'] = data.index.strftime('%Y-%m-%d')
+    data['simple_return'] = data['close'].pct_change()
+    data['log_return'] = np.log(data['close'] / data['close'].shift(1))
+    return data.reset_index(drop=True)
+
 
-        cursor.execute(f"SELECT date, close FROM stock_history WHERE symbol=? ORDER BY date ASC", (symbol,))
-        rows = cursor.fetchall()
+def select_changed_bars(conn, table_name, symbol, data, last_date):
+    """Return the bars that are new or differ from the stored ones.
 
-        if rows:
-            initial_value = rows[0][1]
-            cumulative_return = 0
+    Returns None when an already stored bar before `last_date` changed
+    (e.g. a split or dividend re-adjusted history), which needs a full reload.
+    """
+    stored = pd.read_sql_query(
+        f'SELECT date, {", ".join(BAR_COLUMNS)} FROM {table_name} WHERE symbol=? AND date>=?',
+        conn, params=(symbol, data['date'].iloc[0])
+    )
+    merged = data.merge(stored, on='date', how='left', suffixes=('', '_stored'))
+    changed = merged['adjusted_close_stored'].isna()
+    for column in BAR_COLUMNS:
+        changed |= ~np.isclose(merged[column], merged[f'{column}_stored'], equal_nan=True)
 
-            for i, row in enumerate(rows):
-                if i == 0:
-                    cumulative_return = 0
-                else:
-                    cumulative_return = (row[1] - initial_value) / initial_value
+    if (changed & (merged['date'] < last_date)).any():
+        return None
+    # Rows the overlap holds but that are older than the window are skipped
+    return data[changed.values & (data['date'] >= last_date).values]
 
-                cursor.execute(f"UPDATE stock_history SET cumulative_return=? WHERE symbol=? AND date=?", (cumulative_return, symbol, row[0]))
 
+RETURN_COLUMNS = ['simple_return', 'log_return']
+PRICE_TABLES = ('stock_history', 'index_data')
+
+
+def upsert_bars(conn, table_name, symbol, dates, columns, overwrite=True):
+    """Insert or update many bars of one symbol with a single executemany.
+
+    `dates` is an array of 'YYYY-MM-DD' strings and `columns` maps column
+    names to arrays of the same length. Existing rows have only those
+    columns updated, or are left untouched when `overwrite` is False.
+    Runs inside the caller's transaction; the caller commits.
+    """
+    if table_name not in PRICE_TABLES:
+        raise ValueError(f'Unknown price table: {table_name}')
+    names = list(columns)
+    if overwrite:
+        conflict = 'DO UPDATE SET ' + ', '.join(f'{name}=excluded.{name}' for name in names)
+    else:
+        conflict = 'DO NOTHING'
+    query = f'''
+    INSERT INTO {table_name} (symbol, date, {", ".join(names)})
+    VALUES (?, ?, {", ".join("?" for _ in names)})
+    ON CONFLICT(symbol, date) {conflict}
+    '''
+    # ndarray.tolist() yields native Python values; NaN is stored as NULL
+    params = zip(
+        itertools.repeat(symbol),
+        np.asarray(dates).tolist(),
+        *(np.asarray(columns[name]).tolist() for name in names)
+    )
+    conn.executemany(query, params)
+
+
+def write_bars(conn, table_name, symbol, data):
+    upsert_bars(conn, table_name, symbol, data['date'].to_numpy(),
+                {column: data[column].to_numpy() for column in BAR_COLUMNS + RETURN_COLUMNS})
+
+
+def fetch_and_process_data(symbol, db_path, is_index=False):
+    """Bring a symbol's stored bars up to date, downloading only what is missing.
+
+    Returns the number of bars written.
+    """
+    table_name = 'index_data' if is_index else 'stock_history'
+
+    with get_connection(db_path) as conn:
+        last_date = get_last_ingested_date(conn, table_name, symbol)
+
+        outputsize = choose_outputsize(last_date)
+        data = download_daily_bars(symbol, outputsize)
+        if data.empty:
+            return 0
+
+        delta = data
+        if last_date is not None:
+            delta = select_changed_bars(conn, table_name, symbol, data, last_date)
+            if delta is None and outputsize == 'compact':
+                data = download_daily_bars(symbol, 'full')
+                delta = data
+            elif delta is None:
+                delta = data
+
+        write_bars(conn, table_name, symbol, delta)
+        if not delta.empty:
+            # Only bars from the first changed date onward need new values
+            since = None if delta is data else delta['date'].iloc[0]
+            update_cumulative_returns(conn, table_name, symbol, since)
+            update_indicators(conn, table_name, symbol, since)
+        set_last_ingested_date(conn, table_name, symbol, data['date'].iloc[-1])
         conn.commit()
 
+    if not delta.empty:
+        publish_changes(db_path, table_name, [symbol])
+
+    print(f"{len(delta)} rows processed for symbol {symbol}.")
+    return len(delta)
+
+
+def update_spy_index_data(db_path):
+    try:
+        return fetch_and_process_data('SPY', db_path, is_index=True)
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return 0
 
+def update_cumulative_returns(conn, table_name, symbol, since=None):
+    """Recompute cumulative_return for a symbol's bars dated `since` onward.
 
+    Returns are relative to the symbol's first stored close. Runs inside
+    the caller's transaction and returns the number of rows updated.
+    """
+    if table_name not in PRICE_TABLES:
+        raise ValueError(f'Unknown price table: {table_name}')
+    base = conn.execute(
+        f'SELECT close FROM {table_name} WHERE symbol=? AND close IS NOT NULL ORDER BY date LIMIT 1',
+        (symbol,)
+    ).fetchone()
+    if base is None:
+        return 0
 
-    
+    rows = conn.execute(
+        f'SELECT date, close FROM {table_name} WHERE symbol=? AND date>=? ORDER BY date',
+        (symbol, since or '')
+    ).fetchall()
+    if not rows:
+        return 0
+    dates, closes = zip(*rows)
+    cumulative = np.array(closes, dtype=float) / base[0] - 1.0
+    conn.executemany(
+        f'UPDATE {table_name} SET cumulative_return=? WHERE symbol=? AND date=?',
+        zip(cumulative.tolist(), itertools.repeat(symbol), dates)
+    )
+    return len(rows)
 
 
+def calculate_and_update_cumulative_return(db_path, symbol, table_name='stock_history'):
+    """Recompute a symbol's whole cumulative return column."""
+    with get_connection(db_path) as conn:
+        update_cumulative_returns(conn, table_name, symbol)
+        conn.commit()
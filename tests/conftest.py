@@ -0,0 +1,82 @@
+import pytest
+
+from flaskr import create_app
+from flaskr import main
+from flaskr.db import get_db, init_db
+from flaskr.migrate import apply_migrations
+
+# Latest prices served by the stubbed Alpha Vantage client
+PRICES = {'AAA': '10.00', 'BBB': '25.00'}
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # create_app reads its overrides from FLASK_-prefixed variables
+    monkeypatch.setenv('FLASK_DATABASE', str(tmp_path / 'flaskr.sqlite'))
+    monkeypatch.setenv('FLASK_API_CACHE', 'null')
+    app = create_app()
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        init_db()
+        apply_migrations(get_db())
+
+    yield app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+class StubPriceClient:
+    def __init__(self, symbol):
+        self.symbol = symbol
+
+    def get_daily_stock_price_show(self):
+        return PRICES.get(self.symbol), '2024-01-02'
+
+
+@pytest.fixture
+def stub_prices(monkeypatch):
+    """Serve PRICES instead of calling Alpha Vantage, and skip the background backfill."""
+    monkeypatch.setattr(main, 'Alpha_Vantage_Data', StubPriceClient)
+    monkeypatch.setattr(main, 'fetch_latest_prices', lambda symbols: {symbol: PRICES.get(symbol) for symbol in symbols})
+    monkeypatch.setattr(main, 'queue_backfill', lambda app, symbols: [])
+
+
+def add_user(app, username, balance=1000):
+    with app.app_context():
+        db = get_db()
+        user_id = db.execute('INSERT INTO user_info (username, password, balance) VALUES (?, ?, ?)',
+                             (username, 'x', balance)).lastrowid
+        db.commit()
+    return user_id
+
+
+@pytest.fixture
+def trader(app, client, stub_prices):
+    """A logged-in user with a balance of 1000 and no holdings; returns the user id."""
+    user_id = add_user(app, 'trader')
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+    return user_id
+
+
+def add_holding(app, user_id, symbol, quantity):
+    """Give a user a position, keeping symbol_holdings in step as a trade would."""
+    with app.app_context():
+        db = get_db()
+        db.execute('INSERT INTO user_assets (user_id, symbol, quantity) VALUES (?, ?, ?)', (user_id, symbol, quantity))
+        db.execute('''
+        INSERT INTO symbol_holdings (symbol, total_quantity, holders) VALUES (?, ?, 1)
+        ON CONFLICT(symbol) DO UPDATE SET
+            total_quantity = total_quantity + excluded.total_quantity,
+            holders = holders + 1
+        ''', (symbol, quantity))
+        db.commit()
+
+
+def query(app, sql, params=()):
+    with app.app_context():
+        return [tuple(row) for row in get_db().execute(sql, params).fetchall()]
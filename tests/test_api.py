@@ -0,0 +1,55 @@
+import math
+
+import pytest
+
+from flaskr.db import get_db
+
+
+def seed_prices(db, days=120):
+    """SPY plus two stocks whose daily returns are fixed multiples of SPY's."""
+    for i in range(days):
+        date = f'2024-{1 + i // 28:02d}-{1 + i % 28:02d}'
+        market = 0.01 * math.sin(i)
+        db.execute(
+            'INSERT INTO index_data (symbol, date, adjusted_close, simple_return) VALUES (?, ?, ?, ?)',
+            ('SPY', date, 400 + i, market))
+        for symbol, beta, price in (('AAA', 2.0, 10.0), ('BBB', 0.5, 30.0)):
+            db.execute(
+                'INSERT INTO stock_history (symbol, date, adjusted_close, simple_return) VALUES (?, ?, ?, ?)',
+                (symbol, date, price, beta * market))
+
+
+@pytest.fixture
+def holder(app, client):
+    with app.app_context():
+        db = get_db()
+        user_id = db.execute(
+            "INSERT INTO user_info (username, password) VALUES ('holder', 'x')").lastrowid
+        db.executemany('INSERT INTO user_assets (user_id, symbol, quantity) VALUES (?, ?, ?)',
+                       [(user_id, 'AAA', 3), (user_id, 'BBB', 1)])
+        seed_prices(db)
+        db.commit()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+    return user_id
+
+
+def test_betas_requires_login(client):
+    assert client.get('/api/betas').status_code == 302
+
+
+def test_betas_with_holdings(client, holder):
+    response = client.get('/api/betas')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['benchmark'] == 'SPY'
+    assert set(data['symbols']) == {'AAA', 'BBB'}
+    assert data['symbols']['AAA']['beta'] == pytest.approx(2.0)
+    assert data['symbols']['BBB']['beta'] == pytest.approx(0.5)
+    # Value weights: 3 x 10 in AAA and 1 x 30 in BBB
+    assert data['portfolio_beta'] == pytest.approx(1.25)
+    assert len(data['rolling']['dates']) == len(data['rolling']['betas']['AAA'])
+
+    cached = client.get('/api/betas?rolling=0').get_json()
+    assert 'rolling' not in cached
+    assert cached['portfolio_beta'] == pytest.approx(1.25)
@@ -0,0 +1,60 @@
+import pytest
+
+from flaskr.main import MAX_BATCH_ORDERS
+
+from conftest import add_holding, query
+
+
+def order(symbol, action, quantity):
+    return {'symbol': symbol, 'action': action, 'quantity': quantity}
+
+
+def test_sells_fund_buys_in_the_same_batch(app, client, trader):
+    add_holding(app, trader, 'BBB', 40)
+    # 150 AAA cost 1500, more than the balance until 40 BBB (1000) are sold
+    response = client.post('/transaction/batch', json={'orders': [order('AAA', 'buy', 150), order('BBB', 'sell', 40)]})
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'success'
+    assert query(app, 'SELECT balance FROM user_info WHERE id = ?', (trader,))[0][0] == pytest.approx(500)
+    assert query(app, 'SELECT symbol, quantity FROM user_assets WHERE user_id = ?', (trader,)) == [('AAA', 150)]
+    assert query(app, 'SELECT type FROM transactions_history ORDER BY id') == [('SELL',), ('BUY',)]
+
+
+def test_failed_leg_leaves_no_partial_writes(app, client, trader):
+    response = client.post('/transaction/batch', json={'orders': [order('AAA', 'buy', 10), order('BBB', 'sell', 5)]})
+    assert response.status_code == 409
+    assert response.get_json()['status'] == 'error'
+    assert query(app, 'SELECT balance FROM user_info WHERE id = ?', (trader,))[0][0] == pytest.approx(1000)
+    for table in ('user_assets', 'symbol_holdings', 'transactions_history', 'daily_trade_volume'):
+        assert query(app, f'SELECT * FROM {table}') == []
+
+
+@pytest.mark.parametrize('body', [
+    '{"orders": [',
+    '[{"symbol": "AAA", "action": "buy", "quantity": 1}]',
+    '{"orders": ["AAA"]}',
+    '{"orders": {"symbol": "AAA"}}',
+    '{"orders": [{"symbol": "AAA", "action": "buy", "quantity": 2.7}]}',
+    '{"orders": [{"symbol": "AAA", "action": "buy", "quantity": "2.7"}]}',
+    '{"orders": [{"symbol": "AAA", "action": "hold", "quantity": 1}]}',
+    '{"orders": []}',
+])
+def test_malformed_batch_is_rejected(app, client, trader, body):
+    response = client.post('/transaction/batch', data=body, content_type='application/json')
+    assert response.status_code == 400
+    assert response.get_json()['status'] == 'error'
+    assert query(app, 'SELECT * FROM transactions_history') == []
+
+
+def test_too_many_orders_are_rejected(app, client, trader):
+    orders = [order('AAA', 'buy', 1)] * (MAX_BATCH_ORDERS + 1)
+    response = client.post('/transaction/batch', json={'orders': orders})
+    assert response.status_code == 400
+    assert str(MAX_BATCH_ORDERS) in response.get_json()['message']
+    assert query(app, 'SELECT * FROM transactions_history') == []
+
+
+def test_missing_price_fails_the_whole_batch(app, client, trader):
+    response = client.post('/transaction/batch', json={'orders': [order('AAA', 'buy', 1), order('ZZZ', 'buy', 1)]})
+    assert response.status_code == 502
+    assert query(app, 'SELECT * FROM user_assets') == []
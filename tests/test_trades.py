@@ -0,0 +1,74 @@
+import sqlite3
+
+import pytest
+
+from flaskr import main
+
+from conftest import add_holding, add_user, query
+
+
+def balance(app, user_id):
+    return query(app, 'SELECT balance FROM user_info WHERE id = ?', (user_id,))[0][0]
+
+
+def test_buy(app, client, trader):
+    response = client.post('/transaction/buy', data={'symbol': 'AAA', 'quantity': '5'})
+    assert response.status_code == 302
+    assert balance(app, trader) == pytest.approx(950)
+    assert query(app, 'SELECT symbol, quantity FROM user_assets WHERE user_id = ?', (trader,)) == [('AAA', 5)]
+    assert query(app, 'SELECT total_quantity, holders FROM symbol_holdings WHERE symbol = ?', ('AAA',)) == [(5, 1)]
+    assert query(app, 'SELECT type, quantity FROM transactions_history') == [('BUY', 5)]
+
+
+def test_insufficient_balance_leaves_balance_unchanged(app, client, trader):
+    client.post('/transaction/buy', data={'symbol': 'AAA', 'quantity': '200'})
+    assert balance(app, trader) == pytest.approx(1000)
+    assert query(app, 'SELECT * FROM user_assets') == []
+    assert query(app, 'SELECT * FROM symbol_holdings') == []
+    assert query(app, 'SELECT * FROM transactions_history') == []
+    with client.session_transaction() as session:
+        assert ('error', 'Insufficient balance to complete the transaction.') in session['_flashes']
+
+
+def test_sell_to_zero_deletes_position_and_holder(app, client, trader):
+    add_holding(app, add_user(app, 'other'), 'AAA', 3)
+    client.post('/transaction/buy', data={'symbol': 'AAA', 'quantity': '5'})
+    assert query(app, 'SELECT total_quantity, holders FROM symbol_holdings WHERE symbol = ?', ('AAA',)) == [(8, 2)]
+
+    client.post('/transaction/sell', data={'symbol': 'AAA', 'quantity': '5'})
+    assert query(app, 'SELECT * FROM user_assets WHERE user_id = ?', (trader,)) == []
+    assert query(app, 'SELECT total_quantity, holders FROM symbol_holdings WHERE symbol = ?', ('AAA',)) == [(3, 1)]
+    assert balance(app, trader) == pytest.approx(1000)
+
+
+def test_last_holder_selling_out_removes_symbol_totals(app, client, trader):
+    add_holding(app, trader, 'AAA', 2)
+    client.post('/transaction/sell', data={'symbol': 'AAA', 'quantity': '2'})
+    assert query(app, 'SELECT * FROM symbol_holdings') == []
+
+
+def test_selling_more_than_held_changes_nothing(app, client, trader):
+    add_holding(app, trader, 'AAA', 2)
+    client.post('/transaction/sell', data={'symbol': 'AAA', 'quantity': '3'})
+    assert query(app, 'SELECT quantity FROM user_assets WHERE user_id = ?', (trader,)) == [(2,)]
+    assert balance(app, trader) == pytest.approx(1000)
+
+
+def test_failing_statement_rolls_back_the_whole_trade(app, client, trader, monkeypatch):
+    def fail(*args):
+        raise sqlite3.OperationalError('disk I/O error')
+    # Runs after the balance, position and holdings writes
+    monkeypatch.setattr(main, 'record_transaction', fail)
+
+    response = client.post('/transaction/buy', data={'symbol': 'AAA', 'quantity': '5'})
+    assert response.status_code == 302
+    assert balance(app, trader) == pytest.approx(1000)
+    assert query(app, 'SELECT * FROM user_assets') == []
+    assert query(app, 'SELECT * FROM symbol_holdings') == []
+
+
+@pytest.mark.parametrize('quantity', ['0', '-1', '2.7', 'abc'])
+def test_invalid_quantity_is_rejected(app, client, trader, quantity):
+    client.post('/transaction/buy', data={'symbol': 'AAA', 'quantity': quantity})
+    assert query(app, 'SELECT * FROM user_assets') == []
+    assert balance(app, trader) == pytest.approx(1000)